@@ -0,0 +1,199 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from switcher_core import ConnectionMonitor, ControllerClient, ProxySwitcher, get_proxies_and_groups, percentile
+from switcher_async import AsyncConnectionMonitor, AsyncControllerClient, AsyncProxySwitcher, run_engines
+from mock_controller import MockClashController
+
+HIGHER_IS_BETTER = ("ops_per_sec", "groups_per_sec", "snapshots_per_sec", "detected_ratio")
+LOWER_IS_BETTER = ("p50_ms", "p99_ms")
+
+
+def latency_result(samples, elapsed, **extra):
+    samples = sorted(samples)
+    result = {
+        'count': len(samples),
+        'ops_per_sec': len(samples) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(samples, 0.5),
+        'p99_ms': percentile(samples, 0.99),
+    }
+    result.update(extra)
+    return result
+
+
+def bench_topology(controller, iterations):
+    client = ControllerClient(controller.address)
+    samples = []
+    groups = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        call_start = time.perf_counter()
+        _, groups = get_proxies_and_groups(controller.address, "", client)
+        samples.append((time.perf_counter() - call_start) * 1000)
+    elapsed = time.perf_counter() - start
+    client.close()
+    if not groups:
+        raise SystemExit("get_proxies_and_groups 未返回任何代理组")
+    return latency_result(samples, elapsed, groups=len(groups))
+
+
+def start_engine(engine, controller, switch_logic, concurrency):
+    args = (3600, "", "", controller.address, [], "connection", switch_logic)
+    if engine == "asyncio":
+        switcher = AsyncProxySwitcher(*args, AsyncControllerClient(controller.address), switch_concurrency=concurrency)
+        thread = threading.Thread(target=lambda: asyncio.run(run_engines([switcher], [])), daemon=True)
+    else:
+        switcher = ProxySwitcher(*args, ControllerClient(controller.address), switch_concurrency=concurrency)
+        thread = threading.Thread(target=switcher.run, daemon=True)
+    thread.start()
+    return switcher, thread
+
+
+def bench_switch(engine, controller, iterations, switch_logic, concurrency):
+    switcher, thread = start_engine(engine, controller, switch_logic, concurrency)
+    samples = []
+    switched = 0
+    failed = 0
+    start = time.perf_counter()
+    for _ in range(iterations):
+        call_start = time.perf_counter()
+        result = switcher.request_switch().wait(30)
+        samples.append((time.perf_counter() - call_start) * 1000)
+        if result is None or 'error' in result:
+            raise SystemExit(f"切换请求失败: {result}")
+        outcomes = result['groups'].values()
+        switched += sum(1 for outcome in outcomes if outcome['ok'])
+        failed += sum(1 for outcome in outcomes if not outcome['ok'])
+    elapsed = time.perf_counter() - start
+    switcher.stop()
+    thread.join(timeout=10)
+    return latency_result(samples, elapsed, groups_per_sec=switched / elapsed, failed_groups=failed)
+
+
+def bench_monitor(engine, controller, duration, poll_interval, use_stream):
+    counts = {'snapshots': 0, 'detected': 0}
+
+    def on_stats(interval, missed):
+        counts['snapshots'] += 1
+
+    def on_detected(count, samples, detected_at):
+        counts['detected'] += count
+
+    if engine == "asyncio":
+        monitor = AsyncConnectionMonitor(controller.address, "", poll_interval, use_stream=use_stream,
+                                         client=AsyncControllerClient(controller.address))
+        thread = threading.Thread(target=lambda: asyncio.run(monitor.run_async()), daemon=True)
+    else:
+        monitor = ConnectionMonitor(controller.address, "", poll_interval, use_stream=use_stream,
+                                    client=ControllerClient(controller.address))
+        thread = threading.Thread(target=monitor.run, daemon=True)
+    monitor.poll_stats.connect(on_stats)
+    monitor.connections_detected.connect(on_detected)
+
+    thread.start()
+    time.sleep(min(1.0, duration / 2))
+    created_before = controller.state.created_count
+    detected_before = counts['detected']
+    snapshots_before = counts['snapshots']
+    start = time.perf_counter()
+    time.sleep(duration)
+    elapsed = time.perf_counter() - start
+    created = controller.state.created_count - created_before
+    detected = counts['detected'] - detected_before
+    snapshots = counts['snapshots'] - snapshots_before
+    monitor.stop()
+    thread.join(timeout=10)
+    return {
+        'snapshots': snapshots,
+        'snapshots_per_sec': snapshots / elapsed,
+        'created': created,
+        'detected': detected,
+        'detected_ratio': detected / created if created else 0.0,
+    }
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, metrics in results.items():
+        for key, value in metrics.items():
+            reference = baseline.get(name, {}).get(key)
+            if not reference:
+                continue
+            if key in LOWER_IS_BETTER and value > reference * (1 + tolerance):
+                regressions.append(f"{name}.{key}: {value:.3f} > 基线 {reference:.3f}")
+            elif key in HIGHER_IS_BETTER and value < reference / (1 + tolerance):
+                regressions.append(f"{name}.{key}: {value:.3f} < 基线 {reference:.3f}")
+    return regressions
+
+
+def format_metrics(metrics):
+    return "  ".join(f"{key}={value:.2f}" if isinstance(value, float) else f"{key}={value}" for key, value in metrics.items())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="基于模拟控制器的离线性能测试(代理组查询、切换循环、连接监控)")
+    parser.add_argument("--engines", default="thread,asyncio", help="逗号分隔: thread、asyncio")
+    parser.add_argument("--groups", type=int, default=8)
+    parser.add_argument("--nodes", type=int, default=500)
+    parser.add_argument("--churn", type=float, default=200.0, help="模拟控制器每秒新建连接数")
+    parser.add_argument("--lifetime", type=float, default=5.0, help="模拟连接平均存活时间(秒)")
+    parser.add_argument("--latency", type=float, default=2.0, help="每个API请求注入的固定延迟(毫秒)")
+    parser.add_argument("--latency-jitter", type=float, default=1.0, help="叠加的随机延迟上限(毫秒)")
+    parser.add_argument("--topology-iterations", type=int, default=50)
+    parser.add_argument("--switch-iterations", type=int, default=30)
+    parser.add_argument("--switch-logic", choices=["random", "sequential"], default="sequential")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--monitor-duration", type=float, default=3.0, help="每种监控方式的测量时长(秒)")
+    parser.add_argument("--poll-interval", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="将结果写入JSON文件，可作为之后运行的 --baseline")
+    parser.add_argument("--baseline", help="基线结果JSON文件，任一指标劣化超过 --tolerance 时返回非零退出码")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="允许相对基线劣化的比例")
+    args = parser.parse_args()
+
+    controller = MockClashController(
+        groups=args.groups, nodes=args.nodes, churn=args.churn, lifetime=args.lifetime, seed=args.seed,
+        latency=args.latency, latency_jitter=args.latency_jitter,
+    ).start()
+    print(f"模拟控制器: {controller.address}，{args.groups} 个代理组，{args.nodes} 个节点，"
+          f"每秒新建 {args.churn:g} 个连接，注入延迟 {args.latency:g}+{args.latency_jitter:g}ms")
+
+    results = {}
+    try:
+        results['topology'] = bench_topology(controller, args.topology_iterations)
+        print(f"{'topology':<24} {format_metrics(results['topology'])}")
+        for engine in (value.strip() for value in args.engines.split(",") if value.strip()):
+            name = f"switch.{engine}"
+            results[name] = bench_switch(engine, controller, args.switch_iterations, args.switch_logic, args.concurrency)
+            print(f"{name:<24} {format_metrics(results[name])}")
+            for use_stream in (False, True):
+                name = f"monitor.{engine}.{'stream' if use_stream else 'poll'}"
+                results[name] = bench_monitor(engine, controller, args.monitor_duration, args.poll_interval, use_stream)
+                print(f"{name:<24} {format_metrics(results[name])}")
+    finally:
+        controller.stop()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"性能退化: {line}")
+        if regressions:
+            return 1
+        print("未发现超出容差的性能退化")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
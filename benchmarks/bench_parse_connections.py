@@ -0,0 +1,107 @@
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from switcher_core import ConnectionSnapshotParser, orjson
+from mock_controller import MockClashState
+
+
+def legacy_parse(raw, known_ids):
+    all_current_conns = json.loads(raw).get('connections', [])
+    current_ids = {conn['id'] for conn in all_current_conns}
+    new_ids = current_ids - known_ids
+    new_conns = [conn for conn in all_current_conns if conn['id'] in new_ids]
+    return current_ids, new_conns
+
+
+def synthesize_snapshots(count, churn, frames, seed):
+    state = MockClashState(churn=0, seed=seed)
+    now = time.time()
+    live = {}
+    for _ in range(count):
+        conn_id, conn = state.new_connection(now)
+        conn.pop("_expires")
+        live[conn_id] = conn
+
+    snapshots = []
+    replace = int(count * churn)
+    for _ in range(frames):
+        for conn_id in list(live)[:replace]:
+            del live[conn_id]
+        for _ in range(replace):
+            conn_id, conn = state.new_connection(now)
+            conn.pop("_expires")
+            conn["chains"] = ["节点-0001", "GLOBAL"]
+            live[conn_id] = conn
+        snapshots.append(json.dumps({
+            "downloadTotal": 0, "uploadTotal": 0, "connections": list(live.values()),
+        }, ensure_ascii=False).encode("utf-8"))
+    return snapshots
+
+
+def load_snapshots(paths):
+    snapshots = []
+    for path in paths:
+        with open(path, "rb") as f:
+            snapshots.append(f.read())
+    return snapshots
+
+
+def run(parse, snapshots):
+    known_ids, _ = parse(snapshots[0], set())
+    start = time.perf_counter()
+    new_total = 0
+    for raw in snapshots[1:]:
+        current_ids, new_conns = parse(raw, known_ids)
+        new_total += len(new_conns)
+        known_ids = current_ids
+    elapsed = time.perf_counter() - start
+
+    known_ids, _ = parse(snapshots[0], set())
+    tracemalloc.start()
+    parse(snapshots[-1], known_ids)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed / max(len(snapshots) - 1, 1) * 1000, peak / 1024 / 1024, new_total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/connections 快照解析性能对比")
+    parser.add_argument("snapshots", nargs="*", help="录制的 /connections 响应体文件(JSON)，不指定则自动生成")
+    parser.add_argument("--connections", type=int, default=20000, help="生成快照时的活跃连接数")
+    parser.add_argument("--churn", type=float, default=0.01, help="相邻快照之间被替换的连接比例")
+    parser.add_argument("--frames", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.snapshots:
+        snapshots = load_snapshots(args.snapshots)
+    else:
+        snapshots = synthesize_snapshots(args.connections, args.churn, args.frames, args.seed)
+
+    size_mb = sum(len(raw) for raw in snapshots) / len(snapshots) / 1024 / 1024
+    print(f"快照数: {len(snapshots)}, 平均大小: {size_mb:.2f}MB, orjson: {'可用' if orjson else '不可用'}")
+
+    selective = ConnectionSnapshotParser()
+    results = [
+        ("原有路径(json.loads全量解析)", legacy_parse),
+        ("选择性解析", selective.parse),
+    ]
+    baseline = None
+    for name, parse in results:
+        per_frame_ms, peak_mb, new_total = run(parse, snapshots)
+        if baseline is None:
+            baseline = (per_frame_ms, new_total)
+        elif new_total != baseline[1]:
+            raise SystemExit(f"结果不一致: {name} 识别出 {new_total} 个新连接, 原有路径为 {baseline[1]} 个")
+        print(f"{name:<24} 每帧 {per_frame_ms:8.2f}ms  内存峰值 {peak_mb:8.2f}MB  {baseline[0] / per_frame_ms:5.1f}x")
+    print(f"选择性解析回退到全量解析的次数: {selective.fallback_count}")
+
+
+if __name__ == "__main__":
+    main()
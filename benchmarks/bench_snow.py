@@ -0,0 +1,68 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt6.QtWidgets import QApplication
+from PyQt6.QtCore import QEventLoop, QTimer
+
+from clash_auto_switcher import ClashAutoSwitcherGUI
+
+
+class BenchmarkGUI(ClashAutoSwitcherGUI):
+    def save_app_config(self):
+        pass
+    
+    def save_lists(self):
+        pass
+
+
+def measure(app, duration):
+    loop = QEventLoop()
+    QTimer.singleShot(int(duration * 1000), loop.quit)
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    loop.exec()
+    return (time.process_time() - cpu_start) / (time.perf_counter() - wall_start) * 100
+
+
+def main():
+    parser = argparse.ArgumentParser(description="雪花动画的CPU占用测量(可见、最小化、关闭动画等场景)")
+    parser.add_argument("--duration", type=float, default=5.0, help="每个场景的测量时长(秒)")
+    parser.add_argument("--fps", default="20,60", help="逗号分隔的帧率，分别测量窗口可见时的占用")
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    gui = BenchmarkGUI()
+    gui.show()
+    measure(app, 1.0)
+
+    print(f"平台: {app.platformName()}，雪花数: {len(gui.snowflakes)}，每个场景 {args.duration:g} 秒")
+    print(f"{'场景':<20} {'CPU占用':>8}")
+
+    gui.snow_checkbox.setChecked(True)
+    for fps in (int(value) for value in args.fps.split(",") if value.strip()):
+        gui.snow_fps_input.setValue(fps)
+        print(f"{f'可见 {fps}fps':<20} {measure(app, args.duration):>7.1f}%")
+
+    gui.showMinimized()
+    print(f"{'最小化':<20} {measure(app, args.duration):>7.1f}%")
+    gui.showNormal()
+
+    gui.hide()
+    print(f"{'隐藏':<20} {measure(app, args.duration):>7.1f}%")
+    gui.show()
+
+    gui.snow_checkbox.setChecked(False)
+    print(f"{'关闭动画':<20} {measure(app, args.duration):>7.1f}%")
+    print(f"已缓存雪花贴图: {len(gui.snow_sprites.sprites)} 张")
+
+    gui.snow_timer.stop()
+    gui.hide()
+    gui.deleteLater()
+
+
+if __name__ == "__main__":
+    main()
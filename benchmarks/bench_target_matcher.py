@@ -0,0 +1,78 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from switcher_core import TargetMatcher
+
+
+def legacy_matches(connection_list, host, dest_ip):
+    for item in connection_list:
+        if not item:
+            continue
+        if item in host or item in dest_ip:
+            return True
+    return False
+
+
+def random_label(rng, length):
+    return "".join(rng.choice("abcdefghijklmnopqrstuvwxyz0123456789") for _ in range(length))
+
+
+def build_workload(list_size, lookups, hit_ratio, seed):
+    rng = random.Random(seed)
+    tlds = ["com", "net", "org", "io", "cn"]
+    targets = [f"{random_label(rng, rng.randint(4, 10))}.{rng.choice(tlds)}" for _ in range(list_size)]
+
+    samples = []
+    for _ in range(lookups):
+        if targets and rng.random() < hit_ratio:
+            host = f"{random_label(rng, 3)}.{rng.choice(targets)}"
+        else:
+            host = f"{random_label(rng, 6)}.{random_label(rng, 8)}.{rng.choice(tlds)}"
+        dest_ip = ".".join(str(rng.randint(1, 254)) for _ in range(4))
+        samples.append((host, dest_ip))
+    return targets, samples
+
+
+def measure(func, samples):
+    start = time.perf_counter()
+    hits = 0
+    for host, dest_ip in samples:
+        if func(host, dest_ip):
+            hits += 1
+    elapsed = time.perf_counter() - start
+    return hits, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="访问目标匹配器与原有线性扫描的吞吐量对比")
+    parser.add_argument("--sizes", default="10,100,1000,5000", help="逗号分隔的名单规模")
+    parser.add_argument("--lookups", type=int, default=20000)
+    parser.add_argument("--hit-ratio", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'名单规模':>8} {'线性扫描(次/秒)':>16} {'编译匹配器(次/秒)':>18} {'构建耗时(ms)':>12} {'加速比':>8}")
+    for size in (int(value) for value in args.sizes.split(",")):
+        targets, samples = build_workload(size, args.lookups, args.hit_ratio, args.seed)
+
+        build_start = time.perf_counter()
+        matcher = TargetMatcher(targets)
+        build_ms = (time.perf_counter() - build_start) * 1000
+
+        legacy_hits, legacy_time = measure(lambda host, ip: legacy_matches(targets, host, ip), samples)
+        matcher_hits, matcher_time = measure(matcher.matches, samples)
+        if legacy_hits != matcher_hits:
+            raise SystemExit(f"结果不一致: 线性扫描 {legacy_hits} 次命中, 匹配器 {matcher_hits} 次命中")
+
+        legacy_rate = len(samples) / legacy_time
+        matcher_rate = len(samples) / matcher_time
+        print(f"{size:>8} {legacy_rate:>16.0f} {matcher_rate:>18.0f} {build_ms:>12.1f} {matcher_rate / legacy_rate:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from switcher_core import (ConnectionMonitor, ConnectionThreshold, ControllerClient, MetricsRegistry,
+                           read_connection_recording, read_connection_recording_header, read_list_file)
+
+
+def replay(header, path, filter_mode, connection_list, thresholds, speed):
+    metrics = MetricsRegistry()
+    controller = header.get('controller') or "127.0.0.1:9090"
+    client = ControllerClient(controller)
+    monitor = ConnectionMonitor(controller, "", 1, filter_mode, connection_list,
+                                client=client, name="replay", metrics=metrics)
+    counters = {threshold: ConnectionThreshold(threshold) for threshold in thresholds}
+    switches = dict.fromkeys(thresholds, 0)
+    counted = [0]
+
+    def on_detected(count, samples, detected_at):
+        counted[0] += count
+        for threshold, counter in counters.items():
+            switches[threshold] += 1 if counter.add(count) else 0
+
+    monitor.connections_detected.connect(on_detected)
+
+    new_total = 0
+    frame_count = 0
+    busy = 0.0
+    first_seen = last_seen = None
+    replay_start = time.perf_counter()
+    try:
+        for seen_time, interval, current_ids, new_conns in read_connection_recording(path):
+            if first_seen is None:
+                first_seen = seen_time
+            last_seen = seen_time
+            frame_count += 1
+            if speed > 0:
+                delay = (seen_time - first_seen) / speed - (time.perf_counter() - replay_start)
+                if delay > 0:
+                    time.sleep(delay)
+            monitor.current_interval = interval
+            frame_start = time.perf_counter()
+            monitor.process_snapshot(current_ids, new_conns, seen_time)
+            busy += time.perf_counter() - frame_start
+            new_total += len(new_conns)
+    finally:
+        client.close()
+    wall = time.perf_counter() - replay_start
+
+    return {
+        'frames': frame_count,
+        'duration': last_seen - first_seen if frame_count else 0.0,
+        'new': new_total,
+        'counted': counted[0],
+        'controller': int(monitor.controller_metric.value),
+        'missed': monitor.missed_estimator.missed,
+        'busy': busy,
+        'wall': wall,
+        'switches': switches,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回放录制的 /connections 快照，评估过滤名单和连接阈值设置")
+    parser.add_argument("recording", help="无界面模式 --record-connections 或 controllers.ini 中 record_connections 生成的文件")
+    parser.add_argument("--filter-mode", choices=["blacklist", "whitelist"], default="blacklist")
+    parser.add_argument("--target-list", help="访问目标名单文件，每行一个域名、IP 或 CIDR")
+    parser.add_argument("--thresholds", default="1,5,10,20", help="逗号分隔的连接阈值，分别统计会触发的切换次数")
+    parser.add_argument("--speed", type=float, default=0, help="回放倍速，0 表示不等待、尽可能快")
+    parser.add_argument("--repeat", type=int, default=1, help="重复回放次数，用于得到稳定的吞吐量")
+    args = parser.parse_args()
+
+    header = read_connection_recording_header(args.recording)
+    thresholds = [int(value) for value in args.thresholds.split(",") if value.strip()]
+    connection_list = read_list_file(args.target_list) if args.target_list else []
+
+    results = [replay(header, args.recording, args.filter_mode, connection_list, thresholds, args.speed) for _ in range(args.repeat)]
+    result = results[-1]
+    if not result['frames']:
+        raise SystemExit(f"录制文件中没有任何快照: {args.recording}")
+    duration = result['duration']
+    print(f"录制: 控制器 {header.get('controller')}，{result['frames']} 个快照，时长 {duration:.1f}秒，"
+          f"文件 {os.path.getsize(args.recording) / 1024:.1f}KB")
+    busy = min(item['busy'] for item in results)
+    wall = min(item['wall'] for item in results)
+
+    mode_text = "黑名单" if args.filter_mode == 'blacklist' else "白名单"
+    print(f"过滤: {mode_text}，{len(connection_list)} 项 | 新连接 {result['new']}，计数 {result['counted']}，"
+          f"控制器自身 {result['controller']}，被过滤 {result['new'] - result['counted'] - result['controller']}，"
+          f"估计漏检 {result['missed']:.0f}")
+    print(f"吞吐量: {result['new'] / busy if busy else 0:.0f} 连接/秒，{result['frames'] / busy if busy else 0:.0f} 快照/秒"
+          f"(仅计数逻辑)，回放耗时 {wall * 1000:.1f}ms，相当于 {duration / wall if wall else 0:.0f}x 实时")
+    print("触发切换的次数(同一快照内多次达到阈值只触发一次；切换进行中再次触发时，实际运行还会合并):")
+    print(f"{'连接阈值':>8} {'触发次数':>8} {'平均间隔(秒)':>12}")
+    for threshold in thresholds:
+        fired = result['switches'][threshold]
+        print(f"{threshold:>8} {fired:>8} {duration / fired if fired else 0:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,24 @@
 import sys
-import time
 import os
 import configparser
-import yaml
 import random
 import math
+import time
+import asyncio
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                            QLabel, QLineEdit, QSpinBox, QPushButton, QFileDialog, 
-                           QTextEdit, QGroupBox, QCheckBox, QListWidget, QInputDialog,
+                           QPlainTextEdit, QGroupBox, QCheckBox, QListWidget, QInputDialog,
                            QRadioButton, QButtonGroup, QFrame, QDoubleSpinBox, QStatusBar,
-                           QSizePolicy, QDialog)
-from PyQt6.QtCore import QThread, pyqtSignal, Qt, QTimer, QPoint, QSize
-from PyQt6.QtGui import QFont, QTextCursor, QColor, QIcon, QPalette, QPixmap, QPainter, QPen, QBrush, QLinearGradient
+                           QSizePolicy, QDialog, QComboBox, QTreeView, QHeaderView)
+from PyQt6.QtCore import QObject, QThread, pyqtSignal, Qt, QTimer, QPoint, QPointF, QRect, QSize, QEvent
+from PyQt6.QtGui import QFont, QTextCursor, QTextCharFormat, QTextBlockFormat, QStandardItemModel, QStandardItem, QColor, QIcon, QPalette, QPixmap, QPainter, QPen, QBrush, QLinearGradient, QRegion
 from PyQt6.QtWidgets import QGraphicsDropShadowEffect
-
-import requests
 from datetime import datetime
+from collections import deque
+from switcher_core import (SWITCH_LOGIC_NAMES, CONTROLLERS_TEMPLATE, export_switch_traces, ControllerClient, ConnectionMonitor, ProxySwitcher,
+                           MultiControllerManager, ControlServer, ConnectionThreshold, load_config, load_controller_profiles)
+from switcher_async import (AsyncConnectionMonitor, AsyncControllerClient, AsyncMultiControllerManager,
+                            AsyncProxySwitcher, run_engines)
 
 def get_application_path():
     if hasattr(sys, '_MEIPASS'):
@@ -30,345 +33,260 @@ def get_resource_path(relative_path):
         base_path = os.path.dirname(os.path.abspath(__file__))
         return os.path.join(base_path, relative_path)
 
-def load_config(config_path):
-    try:
-        with open(config_path, 'r', encoding='utf-8') as f:
-            config = yaml.safe_load(f)
-        
-        controller = config.get('external-controller', '127.0.0.1:9090')
-        secret = config.get('secret', '')
-        
-        return {
-            'controller': controller,
-            'secret': secret
-        }
-    except Exception as e:
-        print(f"加载配置文件时出错: {e}")
-        return {
-            'controller': '127.0.0.1:9090',
-            'secret': ''
-        }
-
-def get_proxies_and_groups(api_url, secret):
-    headers = {"Authorization": f"Bearer {secret}"} if secret else {}
-    
-    try:
-        proxies_response = requests.get(f"{api_url}/proxies", headers=headers)
-        proxies_data = proxies_response.json()
-        
-        if proxies_response.status_code != 200:
-            print(f"获取代理列表失败: HTTP {proxies_response.status_code}")
-            return [], []
-        
-        proxy_names = []
-        for name, details in proxies_data.get('proxies', {}).items():
-            if details.get('type') == 'Proxy':
-                proxy_names.append(name)
-        
-        available_groups = []
-        for name, details in proxies_data.get('proxies', {}).items():
-            if details.get('type') in ['Selector', 'URLTest', 'Fallback']:
-                group_info = {
-                    'name': name,
-                    'type': details.get('type'),
-                    'now': details.get('now', ''),
-                    'all': details.get('all', [])
-                }
-                available_groups.append(group_info)
-        
-        return proxy_names, available_groups
-    except Exception as e:
-        print(f"获取代理信息时出错: {e}")
-        return [], []
-
 
 class ConnectionMonitorThread(QThread):
-    connection_detected = pyqtSignal()
+    connections_detected = pyqtSignal(int, list, float)
+    poll_stats = pyqtSignal(float, float)
     log_signal = pyqtSignal(str, str)
     
-    def __init__(self, controller_url, secret, interval=1, connection_filter_mode='blacklist', connection_list=None):
+    def __init__(self, *args, **kwargs):
         super().__init__()
-        self.controller_url = controller_url
-        if not self.controller_url.startswith('http'):
-            self.controller_url = f'http://{self.controller_url}'
-        self.secret = secret
-        self.interval = interval
-        self.running = True
-        self.previous_connection_ids = set()
-        self.connection_filter_mode = connection_filter_mode
-        self.connection_list = connection_list or []
-        
-        import urllib.parse
-        parsed_url = urllib.parse.urlparse(self.controller_url)
-        self.controller_host = parsed_url.hostname or "127.0.0.1"
-        self.controller_port = str(parsed_url.port or 9090)
+        self.monitor = ConnectionMonitor(*args, **kwargs)
+        self.monitor.connections_detected.connect(self.connections_detected.emit)
+        self.monitor.poll_stats.connect(self.poll_stats.emit)
+        self.monitor.log_signal.connect(self.log_signal.emit)
     
     def run(self):
-        self.log_signal.emit(f"开始监控", "info")
-        if self.connection_list:
-            mode_text = "黑名单" if self.connection_filter_mode == 'blacklist' else "白名单"
-            self.log_signal.emit(f"已设置访问目标{mode_text}: {', '.join(self.connection_list)}", "info")
-        
-        headers = {"Authorization": f"Bearer {self.secret}"} if self.secret else {}
-        
-        try:
-            while self.running:
-                try:
-                    response = requests.get(f"{self.controller_url}/connections", headers=headers)
-                    if response.status_code != 200:
-                        self.log_signal.emit(f"获取连接信息失败: HTTP {response.status_code}", "error")
-                        time.sleep(self.interval)
-                        continue
-                    
-                    all_current_conns = response.json().get('connections', [])
-                    current_connection_ids = {conn['id'] for conn in all_current_conns}
-                    
-                    new_connection_ids = current_connection_ids - self.previous_connection_ids
-                    
-                    if new_connection_ids:
-                        new_conns = [conn for conn in all_current_conns if conn['id'] in new_connection_ids]
-                        
-                        valid_new_conns_count = 0
-                        for conn in new_conns:
-                            if self.is_controller_request(conn):
-                                continue
-
-                            is_in_list = self.is_target_in_list(conn)
-                            should_count = False
-
-                            if self.connection_filter_mode == 'blacklist':
-                                if not is_in_list:
-                                    should_count = True
-                            elif self.connection_filter_mode == 'whitelist':
-                                if self.connection_list and is_in_list:
-                                    should_count = True
-                            
-                            if should_count:
-                                host = conn.get('metadata', {}).get('host', 'unknown')
-                                destination = conn.get('metadata', {}).get('destinationIP', 'unknown')
-                                self.log_signal.emit(f"检测到有效新连接: {host} -> {destination}", "info")
-                                self.connection_detected.emit()
-                                valid_new_conns_count += 1
-
-                        if valid_new_conns_count > 0:
-                            self.log_signal.emit(f"本轮检测到 {valid_new_conns_count} 个有效新连接", "highlight")
+        self.monitor.run()
+    
+    def stop(self):
+        self.monitor.stop()
 
-                    self.previous_connection_ids = current_connection_ids
-                    
-                except Exception as e:
-                    self.log_signal.emit(f"监控连接时出错: {e}", "error")
-                
-                time.sleep(self.interval)
-                
-        except Exception as e:
-            self.log_signal.emit(f"连接监控异常: {e}", "error")
-        finally:
-            pass
+class ProxySwitcherThread(QThread):
+    log_signal = pyqtSignal(str, str)
+    status_update = pyqtSignal(bool)
+    used_proxy_update = pyqtSignal(str, str, bool)
+    switch_completed = pyqtSignal(int, int, float)
     
-    def is_controller_request(self, connection):
-        try:
-            metadata = connection.get('metadata', {})
-            dest_ip = metadata.get('destinationIP', '')
-            dest_port = metadata.get('destinationPort', '')
-            
-            is_to_controller = (
-                (dest_ip in ['127.0.0.1', 'localhost', self.controller_host]) and 
-                (str(dest_port) == str(self.controller_port))
-            )
-            
-            host = metadata.get('host', '')
-            if is_to_controller or host == self.controller_host:
-                return True
-                
-            return False
-        except Exception:
-            return False
-            
-    def is_target_in_list(self, connection):
-        try:
-            metadata = connection.get('metadata', {})
-            host = metadata.get('host', '')
-            dest_ip = metadata.get('destinationIP', '')
-            
-            for item in self.connection_list:
-                if not item:
-                    continue
-                if item in host or item in dest_ip:
-                    return True
-            
-            return False
-        except Exception:
-            return False
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self.switcher = ProxySwitcher(*args, **kwargs)
+        self.topology = self.switcher.topology
+        self.switcher.log_signal.connect(self.log_signal.emit)
+        self.switcher.status_update.connect(self.status_update.emit)
+        self.switcher.used_proxy_update.connect(self.used_proxy_update.emit)
+        self.switcher.switch_completed.connect(self.switch_completed.emit)
+    
+    def switch_proxy_now(self, detected_at=None):
+        self.switcher.switch_proxy_now(detected_at)
+    
+    def run(self):
+        self.switcher.run()
     
     def stop(self):
-        self.running = False
+        self.switcher.stop()
 
-class ProxySwitcherThread(QThread):
+class AsyncEngineThread(QThread):
     log_signal = pyqtSignal(str, str)
     status_update = pyqtSignal(bool)
     used_proxy_update = pyqtSignal(str, str, bool)
+    switch_completed = pyqtSignal(int, int, float)
+    connections_detected = pyqtSignal(int, list, float)
+    poll_stats = pyqtSignal(float, float)
     
-    def __init__(self, interval, config_path, secret, controller_address, blacklist=None, switch_mode="time", switch_logic="random"):
+    def __init__(self, switcher):
         super().__init__()
-        self.interval = interval
-        self.config_path = config_path
-        self.secret = secret
-        self.controller_address = controller_address
-        self.blacklist = blacklist or ["最新", "流量", "套餐", "重置", "自动选择", "故障转移", "DIRECT", "REJECT"]
-        self.running = True
-        self.force_switch = False
-        self.switch_mode = switch_mode
-        self.switch_logic = switch_logic
-        
-        self.used_proxies = set()
-        self.available_proxies_cache = {}
-    
-    def switch_proxy_now(self):
-        self.force_switch = True
+        self.switcher = switcher
+        self.monitor = None
+        self.topology = switcher.topology
+        self.switcher.log_signal.connect(self.log_signal.emit)
+        self.switcher.status_update.connect(self.status_update.emit)
+        self.switcher.used_proxy_update.connect(self.used_proxy_update.emit)
+        self.switcher.switch_completed.connect(self.switch_completed.emit)
+    
+    def set_monitor(self, monitor):
+        self.monitor = monitor
+        self.monitor.connections_detected.connect(self.connections_detected.emit)
+        self.monitor.poll_stats.connect(self.poll_stats.emit)
+        self.monitor.log_signal.connect(self.log_signal.emit)
+    
+    def switch_proxy_now(self, detected_at=None):
+        self.switcher.switch_proxy_now(detected_at)
     
     def run(self):
-        self.log_signal.emit(f"已设置黑名单节点: {', '.join(self.blacklist)}", "highlight")
-        self.log_signal.emit(f"切换模式: {('定时切换' if self.switch_mode == 'time' else '连接次数切换')}", "highlight")
-        self.log_signal.emit(f"切换逻辑: {('随机切换' if self.switch_logic == 'random' else '逻辑切换')}", "highlight")
-        
-        api_url = self.controller_address
-        if not api_url.startswith("http://") and not api_url.startswith("https://"):
-            api_url = f"http://{api_url}"
-        
-        try:
-            last_switch_time = time.time()
-            
-            if self.switch_mode == "connection":
-                self.log_signal.emit(f"等待连接次数达到阈值后进行切换...", "info")
-            
-            while self.running:
-                self.status_update.emit(True)
-                
-                current_time = time.time()
-                time_elapsed = current_time - last_switch_time
-                
-                should_switch = False
-                
-                if self.switch_mode == "time" and time_elapsed >= self.interval:
-                    should_switch = True
-                elif self.switch_mode == "connection" and self.force_switch:
-                    should_switch = True
-                
-                if should_switch:
-                    if self.force_switch:
-                        self.force_switch = False
-                
-                    proxy_names, available_groups = get_proxies_and_groups(api_url, self.secret)
-                    
-                    if not available_groups:
-                        self.log_signal.emit("未找到任何可用的代理组。请确保Clash for Windows正在运行。", "warning")
-                        time.sleep(5)
-                        continue
-                    
-                    switched = False
-                    
-                    for group in available_groups:
-                        if group['type'] == 'Selector' or group['name'] == 'GLOBAL':
-                            group_name = group['name']
-                            group_proxies = group.get('all', [])
-                            filtered_proxies = []
-                            
-                            for proxy in group_proxies:
-                                is_blacklisted = False
-                                for black_item in self.blacklist:
-                                    if black_item and black_item in proxy:
-                                        is_blacklisted = True
-                                        break
-                                if not is_blacklisted:
-                                    filtered_proxies.append(proxy)
-                            
-                            if filtered_proxies:
-                                import random
-                                
-                                old_selection = group.get('now', '无')
-                                selected = None
-                                
-                                if self.switch_logic == "random":
-                                    selected = random.choice(filtered_proxies)
-                                else:
-                                    if group_name not in self.available_proxies_cache:
-                                        self.available_proxies_cache[group_name] = set()
-                                    
-                                    if not self.available_proxies_cache[group_name]:
-                                        self.available_proxies_cache[group_name] = set(filtered_proxies)
-                                        self.log_signal.emit(f"组 {group_name} 的代理池已重置，包含 {len(filtered_proxies)} 个代理", "info")
-                                        self.used_proxy_update.emit(group_name, "", True)
-                                    
-                                    if old_selection in self.available_proxies_cache[group_name]:
-                                        self.available_proxies_cache[group_name].remove(old_selection)
-                                        
-                                    if not self.available_proxies_cache[group_name]:
-                                        self.available_proxies_cache[group_name] = set(filtered_proxies)
-                                        self.log_signal.emit(f"组 {group_name} 的所有代理已轮换一遍，重新开始", "info")
-                                        self.used_proxy_update.emit(group_name, "", True)
-                                    
-                                    available_list = list(self.available_proxies_cache[group_name])
-                                    selected = random.choice(available_list)
-                                    
-                                    if selected in self.available_proxies_cache[group_name]:
-                                        self.available_proxies_cache[group_name].remove(selected)
-                                
-                                if selected == old_selection:
-                                    continue
-                                
-                                try:
-                                    headers = {"Authorization": f"Bearer {self.secret}"}
-                                    encoded_group_name = requests.utils.quote(group['name'])
-                                    selector_url = f"{api_url}/proxies/{encoded_group_name}"
-                                    
-                                    response = requests.put(
-                                        selector_url, 
-                                        json={"name": selected}, 
-                                        headers=headers
-                                    )
-                                    
-                                    if response.status_code in [200, 204]:
-                                        timestamp = f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}]"
-                                        
-                                        extra_info = ""
-                                        if self.switch_logic == "sequential":
-                                            remaining = len(self.available_proxies_cache[group_name])
-                                            total = len(filtered_proxies)
-                                            extra_info = f"(剩余可用代理: {remaining}/{total})"
-                                            
-                                            self.used_proxy_update.emit(group_name, selected, False)
-                                            
-                                        self.log_signal.emit(
-                                            f"{timestamp} 已将组 {group['name']} 从 {old_selection} 切换到 {selected} {extra_info}",
-                                            "success"
-                                        )
-                                        switched = True
-                                    else:
-                                        self.log_signal.emit(f"跳过组 {group['name']} - API返回错误: {response.status_code}", "warning")
-                                except Exception as e:
-                                    self.log_signal.emit(f"通过API修改代理选择失败: {e}", "error")
-                            else:
-                                self.log_signal.emit(f"警告: 组 {group['name']} 没有可用的代理节点（排除黑名单后）", "warning")
-                    
-                    if not switched:
-                        self.log_signal.emit("警告: 未能切换任何代理组。请检查您的代理组配置。", "warning")
-                    else:
-                        last_switch_time = time.time()
-                    
-                    if self.switch_mode == "time":
-                        self.log_signal.emit(f"等待 {self.interval} 秒后进行下一次切换...", "info")
-                
-                sleep_time = 1 if self.switch_mode == "time" else 0.1
-                time.sleep(sleep_time)
-                    
-        except Exception as e:
-            self.log_signal.emit(f"异常: {e}", "error")
-        finally:
-            self.status_update.emit(False)
+        asyncio.run(run_engines([self.switcher], [self.monitor] if self.monitor else []))
     
     def stop(self):
-        self.running = False
-        self.log_signal.emit("正在停止代理切换...", "highlight")
+        if self.monitor:
+            self.monitor.stop()
+        self.switcher.stop()
+
+class LogView(QPlainTextEdit):
+    COLORS = {
+        "info": "#3498db",
+        "success": "#2ecc71",
+        "warning": "#f39c12",
+        "error": "#e74c3c",
+        "highlight": "#6AAFE6",
+        "connection": "#6AAFE6",
+        "node": "#1abc9c",
+        "group": "#3B7DB9",
+        "time": "#27ae60",
+        "waiting": "#2980b9",
+        "ascii_art": "#6AAFE6"
+    }
+    LEVELS = {"connection": 0, "info": 1, "node": 1, "group": 1, "time": 1, "waiting": 1,
+              "success": 2, "highlight": 2, "warning": 3, "error": 3, "ascii_art": 3}
+    FILTERS = [("全部", 0), ("隐藏连接明细", 1), ("仅切换结果及以上", 2), ("仅警告和错误", 3)]
+    
+    def __init__(self, capacity=5000, flush_interval=100, parent=None):
+        super().__init__(parent)
+        self.setReadOnly(True)
+        self.setMaximumBlockCount(capacity)
+        self.entries = deque(maxlen=capacity)
+        self.pending = []
+        self.min_level = 0
+        self.auto_scroll = False
+        self.formats = {}
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(flush_interval)
+        self.flush_timer.timeout.connect(self.flush)
+    
+    def char_format(self, message_type):
+        text_format = self.formats.get(message_type)
+        if text_format is None:
+            text_format = QTextCharFormat()
+            text_format.setForeground(QColor(self.COLORS.get(message_type, "#333333")))
+            self.formats[message_type] = text_format
+        return text_format
+    
+    def visible(self, entry):
+        return self.LEVELS.get(entry[1], 1) >= self.min_level
+    
+    def append_entry(self, text, message_type, is_html=False):
+        entry = (text, message_type, is_html)
+        self.entries.append(entry)
+        if self.visible(entry):
+            self.pending.append(entry)
+            if not self.flush_timer.isActive():
+                self.flush_timer.start()
+    
+    def flush(self):
+        self.flush_timer.stop()
+        if not self.pending:
+            return
+        pending = self.pending
+        self.pending = []
+        if len(pending) > self.maximumBlockCount():
+            pending = pending[-self.maximumBlockCount():]
+        self.write_entries(pending)
+        if self.auto_scroll:
+            self.verticalScrollBar().setValue(self.verticalScrollBar().maximum())
+    
+    def write_entries(self, entries):
+        cursor = QTextCursor(self.document())
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.beginEditBlock()
+        for text, message_type, is_html in entries:
+            if not self.document().isEmpty():
+                cursor.insertBlock(QTextBlockFormat(), QTextCharFormat())
+            if is_html:
+                cursor.insertHtml(text)
+            else:
+                cursor.insertText(text, self.char_format(message_type))
+        cursor.endEditBlock()
+    
+    def set_min_level(self, level):
+        self.min_level = level
+        self.flush_timer.stop()
+        self.pending = []
+        self.clear()
+        self.write_entries([entry for entry in self.entries if self.visible(entry)])
+        self.verticalScrollBar().setValue(self.verticalScrollBar().maximum())
+
+class UsedProxyModel(QStandardItemModel):
+    CURRENT_COLOR = QColor("#3498db")
+    EARLIER_COLOR = QColor("#A0B4C8")
+    
+    def __init__(self, limit=500, parent=None):
+        super().__init__(0, 3, parent)
+        self.setHorizontalHeaderLabels(["代理组 / 节点", "次数", "最后使用"])
+        self.limit = limit
+        self.groups = {}
+    
+    def make_row(self, *texts):
+        row = [QStandardItem(text) for text in texts]
+        for item in row:
+            item.setEditable(False)
+        return row
+    
+    def group_entry(self, group_name):
+        entry = self.groups.get(group_name)
+        if entry is None:
+            items = self.make_row(group_name, "", "")
+            font = items[0].font()
+            font.setBold(True)
+            items[0].setFont(font)
+            entry = {'items': items, 'proxies': {}, 'round': 1, 'used': 0}
+            self.groups[group_name] = entry
+            self.appendRow(items)
+        return entry
+    
+    def record(self, group_name, proxy_name):
+        entry = self.group_entry(group_name)
+        now = datetime.now().strftime("%H:%M:%S")
+        row = entry['proxies'].pop(proxy_name, None)
+        if row is None:
+            row = self.make_row(proxy_name, "", now)
+            row[1].setData(0, Qt.ItemDataRole.DisplayRole)
+            for item in row:
+                item.setForeground(self.CURRENT_COLOR)
+            entry['items'][0].appendRow(row)
+        else:
+            row[2].setText(now)
+            for item in row:
+                item.setForeground(self.CURRENT_COLOR)
+        row[1].setData(row[1].data(Qt.ItemDataRole.DisplayRole) + 1, Qt.ItemDataRole.DisplayRole)
+        entry['proxies'][proxy_name] = row
+        
+        if len(entry['proxies']) > self.limit:
+            stale = entry['proxies'].pop(next(iter(entry['proxies'])))
+            entry['items'][0].removeRow(stale[0].row())
+        
+        entry['used'] += 1
+        entry['items'][1].setText(f"第{entry['round']}轮 {entry['used']}次")
+        entry['items'][2].setText(now)
+    
+    def start_round(self, group_name):
+        entry = self.groups.get(group_name)
+        if entry is None or not entry['used']:
+            return
+        entry['round'] += 1
+        entry['used'] = 0
+        for row in entry['proxies'].values():
+            for item in row:
+                item.setForeground(self.EARLIER_COLOR)
+        entry['items'][1].setText(f"第{entry['round']}轮 0次")
+    
+    def clear_history(self):
+        self.removeRows(0, self.rowCount())
+        self.groups = {}
+
+class MultiControllerBridge(QObject):
+    log_signal = pyqtSignal(str, str)
+    status_signal = pyqtSignal(str)
+    running_changed = pyqtSignal(bool)
+    used_proxy_update = pyqtSignal(str, str, bool)
+    switch_completed = pyqtSignal(str, int, int)
+    
+    def __init__(self, manager):
+        super().__init__()
+        self.manager = manager
+        manager.log_signal.connect(self.log_signal.emit)
+        manager.status_signal.connect(self.status_signal.emit)
+        manager.running_changed.connect(self.running_changed.emit)
+        manager.used_proxy_update.connect(self.used_proxy_update.emit)
+        manager.switch_completed.connect(self.switch_completed.emit)
+    
+    def start(self):
+        self.manager.start()
+    
+    def stop(self):
+        self.manager.stop()
+
+SNOW_COLORS = [(255, 255, 255), (230, 240, 255), (220, 240, 255)]
+
 
 class Snowflake:
     def __init__(self, parent_width, parent_height):
@@ -383,16 +301,12 @@ class Snowflake:
         self.rotation = random.uniform(0, 360)
         self.rotation_speed = random.uniform(-2, 2)
         self.shape_type = random.choice([0, 1, 2])
-        self.color = random.choice([
-            QColor(255, 255, 255, self.alpha),
-            QColor(230, 240, 255, self.alpha),
-            QColor(220, 240, 255, self.alpha)
-        ])
+        self.color_index = random.randrange(len(SNOW_COLORS))
         
-    def update(self):
-        self.y += self.speed
-        self.x += self.swing
-        self.rotation += self.rotation_speed
+    def update(self, step=1.0):
+        self.y += self.speed * step
+        self.x += self.swing * step
+        self.rotation += self.rotation_speed * step
         
         if self.y > self.parent_height:
             self.reset()
@@ -407,11 +321,74 @@ class Snowflake:
         self.speed = random.uniform(0.5, 3.0)
         self.swing = random.uniform(-1.5, 1.5)
         self.alpha = random.randint(220, 255)
-        self.color = random.choice([
-            QColor(255, 255, 255, self.alpha),
-            QColor(230, 240, 255, self.alpha),
-            QColor(220, 240, 255, self.alpha)
-        ])
+        self.color_index = random.randrange(len(SNOW_COLORS))
+    
+    def extent(self):
+        return self.size * 2 + 2 if self.shape_type == 1 else self.size + 2
+    
+    def bounds(self):
+        extent = self.extent()
+        return QRect(int(self.x) - extent, int(self.y) - extent, extent * 2, extent * 2)
+
+
+class SnowSpriteCache:
+    ROTATION_STEPS = 12
+    SYMMETRY = {1: 60.0, 2: 72.0}
+    
+    def __init__(self, pixel_ratio=1.0):
+        self.pixel_ratio = pixel_ratio
+        self.sprites = {}
+    
+    def sprite(self, flake):
+        period = self.SYMMETRY.get(flake.shape_type)
+        step = int(flake.rotation % period / period * self.ROTATION_STEPS) if period else 0
+        key = (flake.shape_type, flake.size, flake.color_index, step)
+        pixmap = self.sprites.get(key)
+        if pixmap is None:
+            rotation = step * period / self.ROTATION_STEPS if period else 0.0
+            pixmap = self.render(flake.shape_type, flake.size, QColor(*SNOW_COLORS[flake.color_index]), rotation, flake.extent())
+            self.sprites[key] = pixmap
+        return pixmap
+    
+    def render(self, shape_type, size, color, rotation, extent):
+        pixmap = QPixmap(int(extent * 2 * self.pixel_ratio), int(extent * 2 * self.pixel_ratio))
+        pixmap.setDevicePixelRatio(self.pixel_ratio)
+        pixmap.fill(Qt.GlobalColor.transparent)
+        
+        painter = QPainter(pixmap)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.translate(extent, extent)
+        painter.rotate(rotation)
+        
+        if shape_type == 0:
+            painter.setPen(Qt.PenStyle.NoPen)
+            painter.setBrush(QBrush(color))
+            painter.drawEllipse(QPoint(0, 0), size, size)
+        
+        elif shape_type == 1:
+            painter.setPen(QPen(color, 1))
+            for i in range(6):
+                painter.save()
+                painter.rotate(60 * i)
+                painter.drawLine(0, 0, 0, int(size * 2))
+                painter.drawLine(0, int(size * 0.5), int(size * 0.5), int(size * 0.3))
+                painter.drawLine(0, int(size * 0.5), -int(size * 0.5), int(size * 0.3))
+                painter.drawLine(0, int(size), int(size * 0.7), int(size * 0.7))
+                painter.drawLine(0, int(size), -int(size * 0.7), int(size * 0.7))
+                painter.restore()
+        
+        elif shape_type == 2:
+            painter.setPen(Qt.PenStyle.NoPen)
+            painter.setBrush(QBrush(color))
+            points = []
+            for i in range(10):
+                angle = 2 * math.pi * i / 10
+                radius = size if i % 2 == 0 else size * 0.4
+                points.append(QPointF(radius * math.cos(angle), radius * math.sin(angle)))
+            painter.drawPolygon(points)
+        
+        painter.end()
+        return pixmap
 
 class ClashAutoSwitcherGUI(QMainWindow):
     def __init__(self):
@@ -420,10 +397,15 @@ class ClashAutoSwitcherGUI(QMainWindow):
         self.config = configparser.ConfigParser()
         
         self.initialization_complete = False
-        self.connection_counter = 0
+        self.threshold_counter = ConnectionThreshold(1)
         
         self.switcher_thread = None
         self.monitor_thread = None
+        self.multi_manager = None
+        self.control_server = None
+        self.traced_switchers = {}
+        self.controller_client = None
+        self.controller_client_key = None
         
         self.clash_config_path = ""
         self.switch_interval = 60
@@ -432,8 +414,6 @@ class ClashAutoSwitcherGUI(QMainWindow):
         self.exclude_keywords = []
         self.current_proxy_group = "GLOBAL"
         
-        self.used_proxies_by_group = {}
-        
 
         self.base_dir = get_application_path()
         self.config_dir = os.path.join(self.base_dir, "config")
@@ -476,11 +456,13 @@ class ClashAutoSwitcherGUI(QMainWindow):
         self.log_buffer = []
         
         self.snowflakes = []
+        self.snow_sprites = SnowSpriteCache(self.devicePixelRatioF())
+        self.snow_last_tick = 0.0
         self.snow_timer = QTimer(self)
         self.snow_timer.timeout.connect(self.update_snow)
-        self.snow_timer.start(50)
         
         self.init_snowflakes(100)
+        self.refresh_snow_timer()
     
     def ensure_icons_exist(self):
         resource_clash_icon = get_resource_path(os.path.join("icons", "clash.png"))
@@ -631,7 +613,7 @@ class ClashAutoSwitcherGUI(QMainWindow):
                 padding: 5px;
                 background-color: #FFFFFF;
             }
-            QTextEdit {
+            QTextEdit, QPlainTextEdit {
                 border: 1px solid #6AAFE6;
                 border-radius: 4px;
                 padding: 5px;
@@ -702,32 +684,11 @@ class ClashAutoSwitcherGUI(QMainWindow):
         """
 
     def log(self, message, message_type="info"):
-        color_map = {
-            "info": "#3498db",
-            "success": "#2ecc71",
-            "warning": "#f39c12",
-            "error": "#e74c3c",
-            "highlight": "#6AAFE6",
-            "node": "#1abc9c",
-            "group": "#3B7DB9",
-            "time": "#27ae60",
-            "waiting": "#2980b9",
-            "ascii_art": "#6AAFE6"
-        }
-        
-        color = color_map.get(message_type, "#333333")
-        
-        self.log_text.setTextColor(QColor(color))
-        
         if message_type != "ascii_art":
             timestamp = datetime.now().strftime("%H:%M:%S")
-            self.log_text.append(f"[{timestamp}] {message}")
+            self.log_text.append_entry(f"[{timestamp}] {message}", message_type)
         else:
-            self.log_text.append(message)
-        
-        if hasattr(self, 'initialization_complete') and self.initialization_complete:
-            self.log_text.moveCursor(QTextCursor.MoveOperation.End)
-            self.log_text.ensureCursorVisible()
+            self.log_text.append_entry(message, message_type)
             
     def load_app_config(self):
         self.config.add_section('Clash')
@@ -735,12 +696,16 @@ class ClashAutoSwitcherGUI(QMainWindow):
         self.clash_config_path = ""
         self.controller_address = "127.0.0.1:9090"
         self.api_secret = ""
+        self.snow_enabled = True
+        self.snow_fps = 20
         
         if os.path.exists(self.config_file_path):
             try:
                 self.config.read(self.config_file_path, encoding='utf-8')
                 if 'Clash' in self.config:
                     self.clash_config_path = self.config.get('Clash', 'config_path', fallback="")
+                    self.snow_enabled = self.config.getboolean('Clash', 'snow_enabled', fallback=True)
+                    self.snow_fps = min(60, max(1, self.config.getint('Clash', 'snow_fps', fallback=20)))
                     
                     if self.clash_config_path and os.path.exists(self.clash_config_path):
                         self.add_log(f"已从配置文件加载Clash配置: {self.clash_config_path}", "info")
@@ -771,6 +736,8 @@ class ClashAutoSwitcherGUI(QMainWindow):
             self.config.add_section('Clash')
         
         self.config.set('Clash', 'config_path', self.config_file_input.text())
+        self.config.set('Clash', 'snow_enabled', str(self.snow_checkbox.isChecked()).lower())
+        self.config.set('Clash', 'snow_fps', str(self.snow_fps_input.value()))
         
         try:
             os.makedirs(os.path.dirname(self.config_file_path), exist_ok=True)
@@ -1082,6 +1049,46 @@ class ClashAutoSwitcherGUI(QMainWindow):
         config_file_layout.addWidget(config_file_button)
         config_layout.addLayout(config_file_layout)
         
+        concurrency_layout = QHBoxLayout()
+        concurrency_label = QLabel("并发切换组数:")
+        self.concurrency_input = QSpinBox()
+        self.concurrency_input.setRange(1, 32)
+        self.concurrency_input.setValue(8)
+        concurrency_layout.addWidget(concurrency_label)
+        concurrency_layout.addWidget(self.concurrency_input)
+        config_layout.addLayout(concurrency_layout)
+        
+        self.drain_checkbox = QCheckBox("切换后断开经过该代理组的旧连接，使新节点立即生效")
+        config_layout.addWidget(self.drain_checkbox)
+        
+        self.multi_controller_checkbox = QCheckBox("多控制器模式(读取 config/controllers.ini)")
+        config_layout.addWidget(self.multi_controller_checkbox)
+        
+        self.async_engine_checkbox = QCheckBox("使用asyncio引擎(监控、探测和切换共用一个事件循环线程)")
+        config_layout.addWidget(self.async_engine_checkbox)
+        
+        control_api_layout = QHBoxLayout()
+        self.control_api_checkbox = QCheckBox("启用本地控制API，端口:")
+        self.control_api_port_input = QSpinBox()
+        self.control_api_port_input.setRange(1, 65535)
+        self.control_api_port_input.setValue(9099)
+        control_api_layout.addWidget(self.control_api_checkbox)
+        control_api_layout.addWidget(self.control_api_port_input)
+        config_layout.addLayout(control_api_layout)
+        
+        snow_layout = QHBoxLayout()
+        self.snow_checkbox = QCheckBox("雪花动画，帧率:")
+        self.snow_checkbox.setChecked(self.snow_enabled)
+        self.snow_fps_input = QSpinBox()
+        self.snow_fps_input.setRange(1, 60)
+        self.snow_fps_input.setValue(self.snow_fps)
+        self.snow_fps_input.setEnabled(self.snow_enabled)
+        self.snow_checkbox.toggled.connect(self.on_snow_settings_changed)
+        self.snow_fps_input.valueChanged.connect(self.on_snow_settings_changed)
+        snow_layout.addWidget(self.snow_checkbox)
+        snow_layout.addWidget(self.snow_fps_input)
+        config_layout.addLayout(snow_layout)
+        
         mode_group = QGroupBox("切换模式")
         mode_layout = QVBoxLayout()
         mode_group.setLayout(mode_layout)
@@ -1140,6 +1147,18 @@ class ClashAutoSwitcherGUI(QMainWindow):
         
         self.random_logic_radio = QRadioButton("随机切换")
         self.sequential_logic_radio = QRadioButton("逻辑切换")
+        self.latency_logic_radio = QRadioButton("低延迟切换")
+        
+        latency_layout = QHBoxLayout()
+        latency_label = QLabel("延迟上限(ms):")
+        self.latency_cutoff_input = QSpinBox()
+        self.latency_cutoff_input.setRange(50, 10000)
+        self.latency_cutoff_input.setSingleStep(50)
+        self.latency_cutoff_input.setValue(800)
+        latency_layout.addWidget(self.latency_logic_radio)
+        latency_layout.addStretch()
+        latency_layout.addWidget(latency_label)
+        latency_layout.addWidget(self.latency_cutoff_input)
         
         sequential_desc = QLabel("逻辑切换: 切换过的代理节点暂时不会再被选择，直到所有可用节点都被使用一遍后再重新开始")
         sequential_desc.setWordWrap(True)
@@ -1159,10 +1178,12 @@ class ClashAutoSwitcherGUI(QMainWindow):
         self.logic_group = QButtonGroup()
         self.logic_group.addButton(self.random_logic_radio, 1)
         self.logic_group.addButton(self.sequential_logic_radio, 2)
+        self.logic_group.addButton(self.latency_logic_radio, 3)
         self.logic_group.buttonClicked.connect(self.on_logic_changed)
         
         logic_layout.addWidget(self.random_logic_radio)
         logic_layout.addWidget(self.sequential_logic_radio)
+        logic_layout.addLayout(latency_layout)
         logic_layout.addWidget(sequential_desc)
         
         config_layout.addWidget(logic_group)
@@ -1177,7 +1198,7 @@ class ClashAutoSwitcherGUI(QMainWindow):
         settings_container_layout = QVBoxLayout(settings_container)
         settings_container_layout.setContentsMargins(0, 0, 0, 0)
         
-        max_height = 150
+        max_height = 215
         settings_container.setFixedHeight(max_height)
         config_layout.addWidget(settings_container)
         
@@ -1254,6 +1275,29 @@ class ClashAutoSwitcherGUI(QMainWindow):
         threshold_layout.addWidget(self.threshold_input)
         connection_settings_layout.addLayout(threshold_layout)
 
+        adaptive_layout = QHBoxLayout()
+        self.adaptive_poll_checkbox = QCheckBox("自适应轮询")
+        self.adaptive_min_input = QDoubleSpinBox()
+        self.adaptive_min_input.setRange(0.1, 10)
+        self.adaptive_min_input.setSingleStep(0.1)
+        self.adaptive_min_input.setDecimals(1)
+        self.adaptive_min_input.setValue(0.2)
+        self.adaptive_max_input = QDoubleSpinBox()
+        self.adaptive_max_input.setRange(0.1, 10)
+        self.adaptive_max_input.setSingleStep(0.1)
+        self.adaptive_max_input.setDecimals(1)
+        self.adaptive_max_input.setValue(2.0)
+        adaptive_layout.addWidget(self.adaptive_poll_checkbox)
+        adaptive_layout.addWidget(QLabel("下限:"))
+        adaptive_layout.addWidget(self.adaptive_min_input)
+        adaptive_layout.addWidget(QLabel("上限:"))
+        adaptive_layout.addWidget(self.adaptive_max_input)
+        connection_settings_layout.addLayout(adaptive_layout)
+        
+        self.stream_checkbox = QCheckBox("使用WebSocket推送(不可用时回退到轮询)")
+        self.stream_checkbox.setChecked(True)
+        connection_settings_layout.addWidget(self.stream_checkbox)
+
         self.connection_counter_label = QLabel("当前连接计数: 0")
         connection_settings_layout.addWidget(self.connection_counter_label)
         
@@ -1288,10 +1332,20 @@ class ClashAutoSwitcherGUI(QMainWindow):
             }
         """)
         
-        self.used_proxies_text = QTextEdit()
-        self.used_proxies_text.setReadOnly(True)
-        self.used_proxies_text.setStyleSheet("""
-            QTextEdit {
+        self.used_proxies_model = UsedProxyModel(parent=self)
+        self.used_proxies_model.rowsInserted.connect(self.on_used_proxy_rows_inserted)
+        self.used_proxies_view = QTreeView()
+        self.used_proxies_view.setModel(self.used_proxies_model)
+        self.used_proxies_view.setUniformRowHeights(True)
+        self.used_proxies_view.setEditTriggers(QTreeView.EditTrigger.NoEditTriggers)
+        self.used_proxies_view.header().setStretchLastSection(False)
+        self.used_proxies_view.header().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        self.used_proxies_view.header().setSectionResizeMode(1, QHeaderView.ResizeMode.Fixed)
+        self.used_proxies_view.header().setSectionResizeMode(2, QHeaderView.ResizeMode.Fixed)
+        self.used_proxies_view.setColumnWidth(1, 80)
+        self.used_proxies_view.setColumnWidth(2, 70)
+        self.used_proxies_view.setStyleSheet("""
+            QTreeView {
                 border: 1px solid #6AAFE6;
                 border-radius: 4px;
                 padding: 5px;
@@ -1300,15 +1354,19 @@ class ClashAutoSwitcherGUI(QMainWindow):
             }
         """)
         
-        self.used_proxies_text.setHtml("<div style='color: #8BADD9; text-align: center; margin-top: 20px;'>暂无已使用的代理</div>")
+        self.used_proxies_empty_label = QLabel("暂无已使用的代理")
+        self.used_proxies_empty_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.used_proxies_empty_label.setStyleSheet("color: #8BADD9; background-color: transparent;")
         
         proxies_shadow = QGraphicsDropShadowEffect(self)
         proxies_shadow.setBlurRadius(10)
         proxies_shadow.setColor(QColor(106, 175, 230, 30))
         proxies_shadow.setOffset(0, 0)
-        self.used_proxies_text.setGraphicsEffect(proxies_shadow)
+        self.used_proxies_view.setGraphicsEffect(proxies_shadow)
         
-        used_proxies_layout.addWidget(self.used_proxies_text)
+        used_proxies_layout.addWidget(self.used_proxies_empty_label)
+        used_proxies_layout.addWidget(self.used_proxies_view)
+        self.used_proxies_view.setVisible(False)
         
         right_layout.addWidget(self.used_proxies_group)
         
@@ -1346,6 +1404,14 @@ class ClashAutoSwitcherGUI(QMainWindow):
         self.stop_button.setSizePolicy(QSizePolicy.Policy.Fixed, QSizePolicy.Policy.Fixed)
         add_shadow_effect(self.stop_button)
         
+        self.export_trace_button = QPushButton("导出切换追踪")
+        self.export_trace_button.setStyleSheet(self.get_button_style())
+        self.export_trace_button.clicked.connect(self.export_switch_traces)
+        self.export_trace_button.setMinimumHeight(35)
+        self.export_trace_button.setFixedHeight(35)
+        self.export_trace_button.setSizePolicy(QSizePolicy.Policy.Fixed, QSizePolicy.Policy.Fixed)
+        add_shadow_effect(self.export_trace_button)
+        
         self.about_button = QPushButton("关于")
         self.about_button.setStyleSheet(self.get_button_style())
         self.about_button.clicked.connect(self.show_about_dialog)
@@ -1357,6 +1423,7 @@ class ClashAutoSwitcherGUI(QMainWindow):
         control_layout.addWidget(self.test_button)
         control_layout.addWidget(self.start_button)
         control_layout.addWidget(self.stop_button)
+        control_layout.addWidget(self.export_trace_button)
         control_layout.addStretch()
         control_layout.addWidget(self.about_button)
         
@@ -1382,8 +1449,17 @@ class ClashAutoSwitcherGUI(QMainWindow):
                 color: #3B7DB9;
             }
         """)
-        self.log_text = QTextEdit()
-        self.log_text.setReadOnly(True)
+        log_filter_layout = QHBoxLayout()
+        log_filter_layout.addWidget(QLabel("显示级别:"))
+        self.log_level_combo = QComboBox()
+        for label, level in LogView.FILTERS:
+            self.log_level_combo.addItem(label, level)
+        self.log_level_combo.currentIndexChanged.connect(self.on_log_level_changed)
+        log_filter_layout.addWidget(self.log_level_combo)
+        log_filter_layout.addStretch()
+        log_layout.addLayout(log_filter_layout)
+        
+        self.log_text = LogView()
         self.log_text.setFont(QFont("Courier", 10))
         
         self.log_text.setMinimumHeight(200)
@@ -1408,15 +1484,28 @@ class ClashAutoSwitcherGUI(QMainWindow):
         self.setStatusBar(self.statusBar)
         self.statusBar.showMessage("就绪")
         
+        self.poll_status_label = QLabel("")
+        self.poll_status_label.setStyleSheet("background-color: transparent; color: #3B7DB9;")
+        self.statusBar.addPermanentWidget(self.poll_status_label)
+        
+        self.trace_status_label = QLabel("")
+        self.trace_status_label.setStyleSheet("background-color: transparent; color: #3B7DB9;")
+        self.statusBar.addPermanentWidget(self.trace_status_label)
+        
         self.show_ascii_art()
         
         QTimer.singleShot(100, self.scroll_to_top)
         
         self.initialization_complete = True
     
+    def on_log_level_changed(self, index):
+        self.log_text.set_min_level(self.log_level_combo.itemData(index))
+    
     def scroll_to_top(self):
+        self.log_text.flush()
         self.log_text.moveCursor(QTextCursor.MoveOperation.Start)
         self.log_text.ensureCursorVisible()
+        self.log_text.auto_scroll = True
     
     def on_mode_changed(self, button):
         if button == self.time_mode_radio:
@@ -1431,36 +1520,29 @@ class ClashAutoSwitcherGUI(QMainWindow):
     def on_logic_changed(self, button):
         if button == self.random_logic_radio:
             self.log("已选择随机切换逻辑", "info")
+        elif button == self.latency_logic_radio:
+            self.log("已选择低延迟切换逻辑，将在后台探测节点延迟并仅在延迟上限内的节点中选择", "info")
         else:
             self.log("已选择逻辑切换逻辑", "info")
     
     def update_used_proxies(self, group_name, proxy_name, clear=False):
         if clear:
-            if group_name in self.used_proxies_by_group:
-                self.used_proxies_by_group[group_name] = []
+            self.used_proxies_model.start_round(group_name)
         else:
-            if group_name not in self.used_proxies_by_group:
-                self.used_proxies_by_group[group_name] = []
-            self.used_proxies_by_group[group_name].append(proxy_name)
-        
-        self.refresh_used_proxies_display()
-    
-    def refresh_used_proxies_display(self):
-        text = ""
-        for group_name, proxies in self.used_proxies_by_group.items():
-            if proxies:
-                text += f"<div style='margin-bottom: 10px;'>"
-                text += f"<div style='font-weight: bold; color: #3B7DB9; background-color: #D9EAFF; padding: 3px; border-radius: 3px; border-left: 3px solid #6AAFE6;'>组: {group_name}</div>"
-                for i, proxy in enumerate(proxies):
-                    text += f"<div style='margin-left: 10px; padding: 2px; border-bottom: 1px dotted #6AAFE6;'>"
-                    text += f"{i+1}. <span style='color: #3498db;'>{proxy}</span>"
-                    text += "</div>"
-                text += "</div>"
-        
-        if not text:
-            text = "<div style='color: #8BADD9; text-align: center; margin-top: 20px;'>暂无已使用的代理</div>"
-            
-        self.used_proxies_text.setHtml(text)
+            self.used_proxies_model.record(group_name, proxy_name)
+    
+    def on_used_proxy_rows_inserted(self, parent, first, last):
+        if parent.isValid():
+            return
+        for row in range(first, last + 1):
+            self.used_proxies_view.expand(self.used_proxies_model.index(row, 0))
+        self.used_proxies_empty_label.setVisible(False)
+        self.used_proxies_view.setVisible(True)
+    
+    def reset_used_proxies(self):
+        self.used_proxies_model.clear_history()
+        self.used_proxies_view.setVisible(False)
+        self.used_proxies_empty_label.setVisible(True)
     
     def show_ascii_art(self):
         ascii_art = r"""
@@ -1477,17 +1559,18 @@ class ClashAutoSwitcherGUI(QMainWindow):
         github_html = "<div style='text-align: center; color: #6AAFE6;'>github：https://github.com/yoruak1</div>"
         wechat_html = "<div style='text-align: center; color: #6AAFE6;'>公众号：夜秋的小屋</div>"
         
-        self.log_text.append(title_html)
-        self.log_text.append(author_html)
-        self.log_text.append(github_html)
-        self.log_text.append(wechat_html)
-        self.log_text.append("<br>")
+        self.log_text.append_entry(title_html, "ascii_art", True)
+        self.log_text.append_entry(author_html, "ascii_art", True)
+        self.log_text.append_entry(github_html, "ascii_art", True)
+        self.log_text.append_entry(wechat_html, "ascii_art", True)
+        self.log_text.append_entry("<br>", "ascii_art", True)
         
         tip_html = "<div style='text-align: center; color: #3B7DB9; background-color: #D9EAFF; padding: 5px; border-radius: 5px; border: 1px dashed #6AAFE6;'>"
         tip_html += "提示: 请先选择Clash配置文件，然后点击「测试连接」确认连接正常后开始自动切换"
         tip_html += "</div>"
-        self.log_text.append(tip_html)
-        self.log_text.append("<br>")
+        self.log_text.append_entry(tip_html, "ascii_art", True)
+        self.log_text.append_entry("<br>", "ascii_art", True)
+        self.log_text.flush()
         
         self.log_text.moveCursor(QTextCursor.MoveOperation.Start)
         self.log_text.ensureCursorVisible()
@@ -1545,6 +1628,7 @@ class ClashAutoSwitcherGUI(QMainWindow):
         if ok and text:
             self.blacklist_input.addItem(text)
             self.save_lists()
+            self.apply_blacklist()
     
     def remove_blacklist_item(self):
         selected_items = self.blacklist_input.selectedItems()
@@ -1553,6 +1637,13 @@ class ClashAutoSwitcherGUI(QMainWindow):
         for item in selected_items:
             self.blacklist_input.takeItem(self.blacklist_input.row(item))
         self.save_lists()
+        self.apply_blacklist()
+    
+    def apply_blacklist(self):
+        if self.switcher_thread and self.switcher_thread.isRunning():
+            blacklist = self.get_blacklist()
+            self.switcher_thread.topology.set_blacklist(blacklist)
+            self.log(f"已更新运行中的节点关键词黑名单: {', '.join(blacklist)}", "info")
     
     def get_blacklist(self):
         blacklist = []
@@ -1563,7 +1654,7 @@ class ClashAutoSwitcherGUI(QMainWindow):
     def add_conn_blacklist_item(self):
         dialog = QInputDialog(self)
         dialog.setWindowTitle("添加访问黑名单项")
-        dialog.setLabelText("请输入域名或IP地址:")
+        dialog.setLabelText("请输入域名、IP地址或CIDR网段(如 10.0.0.0/8):")
         dialog.setStyleSheet("""
             QInputDialog {
                 background-color: #E6F3FF;
@@ -1617,7 +1708,7 @@ class ClashAutoSwitcherGUI(QMainWindow):
     def add_conn_whitelist_item(self):
         dialog = QInputDialog(self)
         dialog.setWindowTitle("添加访问白名单项")
-        dialog.setLabelText("请输入域名或IP地址:")
+        dialog.setLabelText("请输入域名、IP地址或CIDR网段(如 10.0.0.0/8):")
         dialog.setStyleSheet("""
             QInputDialog {
                 background-color: #E6F3FF;
@@ -1669,23 +1760,18 @@ class ClashAutoSwitcherGUI(QMainWindow):
         return whitelist
     
     def test_connection(self):
-        controller = self.controller_address
-        secret = self.api_secret
-        
-        test_headers = {"Authorization": f"Bearer {secret}"} if secret else {}
-        controller_url = controller
-        if not controller_url.startswith("http://") and not controller_url.startswith("https://"):
-            controller_url = f"http://{controller_url}"
+        client = self.get_controller_client()
+        controller_url = client.base_url
             
         self.log(f"正在测试与控制器 {controller_url} 的连接...", "info")
         self.statusBar.showMessage("正在测试连接...")
         
         try:
-            test_response = requests.get(f"{controller_url}/version", headers=test_headers)
+            test_response = client.get("/version")
             version = test_response.json().get('version', '未知')
             self.log(f"控制器连接测试成功! Clash 版本: {version}", "success")
             
-            test_response = requests.get(f"{controller_url}/connections", headers=test_headers)
+            test_response = client.get("/connections")
             if test_response.status_code == 200:
                 connections = test_response.json().get('connections', [])
                 self.log(f"连接监控API测试成功! 当前活跃连接数: {len(connections)}", "success")
@@ -1721,10 +1807,26 @@ class ClashAutoSwitcherGUI(QMainWindow):
                 }
             """)
     
+    def get_controller_client(self):
+        key = (self.controller_address, self.api_secret)
+        if self.controller_client is None or self.controller_client_key != key:
+            if self.controller_client is not None:
+                self.controller_client.close()
+            self.controller_client = ControllerClient(self.controller_address, self.api_secret)
+            self.controller_client_key = key
+        return self.controller_client
+    
     def start_switching(self):
         if self.switcher_thread and self.switcher_thread.isRunning():
             self.log("代理切换已经在运行中", "warning")
             return
+        if self.multi_manager is not None:
+            self.log("多控制器模式已经在运行中", "warning")
+            return
+        
+        if self.multi_controller_checkbox.isChecked():
+            self.start_multi_controller()
+            return
         
         controller = self.controller_address
         secret = self.api_secret
@@ -1734,35 +1836,54 @@ class ClashAutoSwitcherGUI(QMainWindow):
         
         switch_mode = "time" if self.time_mode_radio.isChecked() else "connection"
         
-        switch_logic = "random" if self.random_logic_radio.isChecked() else "sequential"
+        if self.random_logic_radio.isChecked():
+            switch_logic = "random"
+        elif self.latency_logic_radio.isChecked():
+            switch_logic = "latency"
+        else:
+            switch_logic = "sequential"
         
-        self.used_proxies_by_group = {}
-        self.refresh_used_proxies_display()
+        self.reset_used_proxies()
         
         self.start_button.setEnabled(False)
         self.stop_button.setEnabled(True)
         self.statusBar.showMessage("正在启动代理切换...")
         
         mode_text = "定时切换模式" if switch_mode == "time" else "连接次数切换模式"
-        logic_text = "随机切换" if switch_logic == "random" else "逻辑切换"
+        logic_text = SWITCH_LOGIC_NAMES[switch_logic]
         
         if switch_mode == "time":
             self.log(f"正在启动{mode_text}，{logic_text}，间隔时间为 {interval} 秒", "success")
         else:
             self.log(f"正在启动{mode_text}，{logic_text}，连接阈值为 {self.threshold_input.value()} 次", "success")
         
-        self.switcher_thread = ProxySwitcherThread(interval, config_path, secret, controller, blacklist, switch_mode, switch_logic)
+        use_async = self.async_engine_checkbox.isChecked()
+        client = AsyncControllerClient(controller, secret) if use_async else self.get_controller_client()
+        switcher_args = (interval, config_path, secret, controller, blacklist, switch_mode, switch_logic, client)
+        switcher_kwargs = {
+            'switch_concurrency': self.concurrency_input.value(),
+            'latency_cutoff': self.latency_cutoff_input.value(),
+            'drain_connections': self.drain_checkbox.isChecked(),
+        }
+        
+        if use_async:
+            self.switcher_thread = AsyncEngineThread(AsyncProxySwitcher(*switcher_args, **switcher_kwargs))
+            self.log("使用asyncio引擎运行", "info")
+        else:
+            self.switcher_thread = ProxySwitcherThread(*switcher_args, **switcher_kwargs)
         self.switcher_thread.log_signal.connect(self.log)
         self.switcher_thread.status_update.connect(self.update_status)
         self.switcher_thread.used_proxy_update.connect(self.update_used_proxies)
-        self.switcher_thread.start()
+        self.switcher_thread.switch_completed.connect(self.update_trace_status)
+        self.traced_switchers = {"default": self.switcher_thread.switcher}
+        self.trace_status_label.setText("")
         
         if switch_mode == "connection":
-            self.connection_counter = 0
+            self.threshold_counter = ConnectionThreshold(self.threshold_input.value())
             self.update_connection_counter_label()
+            self.poll_status_label.setText("")
             
             api_poll_interval = self.api_poll_input.value()
-            self.connection_threshold = self.threshold_input.value()
             
             connection_filter_mode = 'blacklist'
             connection_list = []
@@ -1779,28 +1900,148 @@ class ClashAutoSwitcherGUI(QMainWindow):
                 else:
                     self.log("警告: 访问过滤模式为白名单，但列表为空，将不会有任何连接被计数", "warning")
 
-            self.monitor_thread = ConnectionMonitorThread(controller, secret, api_poll_interval, connection_filter_mode, connection_list)
-            self.monitor_thread.log_signal.connect(self.log)
-            self.monitor_thread.connection_detected.connect(self.on_connection_detected)
-            self.monitor_thread.start()
-            self.log(f"启动API连接监控，轮询间隔: {api_poll_interval}秒", "info")
-            self.log(f"连接阈值设置为: {self.connection_threshold}次", "info")
+            use_stream = self.stream_checkbox.isChecked()
+            adaptive_bounds = None
+            if self.adaptive_poll_checkbox.isChecked() and not use_stream:
+                adaptive_bounds = (self.adaptive_min_input.value(), max(self.adaptive_min_input.value(), self.adaptive_max_input.value()))
+            monitor_args = (controller, secret, api_poll_interval, connection_filter_mode, connection_list, use_stream, client)
+            if use_async:
+                self.switcher_thread.set_monitor(AsyncConnectionMonitor(*monitor_args, adaptive_bounds=adaptive_bounds))
+                self.switcher_thread.connections_detected.connect(self.on_connections_detected)
+                self.switcher_thread.poll_stats.connect(self.on_poll_stats)
+            else:
+                self.monitor_thread = ConnectionMonitorThread(*monitor_args, adaptive_bounds=adaptive_bounds)
+                self.monitor_thread.log_signal.connect(self.log)
+                self.monitor_thread.connections_detected.connect(self.on_connections_detected)
+                self.monitor_thread.poll_stats.connect(self.on_poll_stats)
+                self.monitor_thread.start()
+            if use_stream:
+                self.log(f"启动API连接监控，优先使用WebSocket推送，推送间隔: {api_poll_interval}秒", "info")
+            elif adaptive_bounds:
+                self.log(f"启动API连接监控，自适应轮询间隔: {adaptive_bounds[0]}~{adaptive_bounds[1]}秒", "info")
+            else:
+                self.log(f"启动API连接监控，轮询间隔: {api_poll_interval}秒", "info")
+            self.log(f"连接阈值设置为: {self.threshold_counter.threshold}次", "info")
+        
+        self.switcher_thread.start()
+        self.start_control_server({"default": self.switcher_thread.switcher})
+    
+    def start_control_server(self, switchers):
+        if not self.control_api_checkbox.isChecked():
+            return
+        self.stop_control_server()
+        try:
+            self.control_server = ControlServer(switchers, port=self.control_api_port_input.value())
+            self.control_server.start()
+            self.log(f"本地控制API已启动: {self.control_server.address} (POST /switch、/pause、/resume，GET /selections、/stats、/traces、/metrics)", "success")
+        except OSError as e:
+            self.control_server = None
+            self.log(f"本地控制API启动失败: {e}", "error")
+    
+    def stop_control_server(self):
+        if self.control_server is not None:
+            self.control_server.stop()
+            self.control_server = None
+            self.log("本地控制API已停止", "info")
             
-    def on_connection_detected(self):
-        self.connection_counter += 1
-        self.update_connection_counter_label()
+    def start_multi_controller(self):
+        controllers_file = os.path.join(self.config_dir, "controllers.ini")
+        if not os.path.exists(controllers_file):
+            os.makedirs(self.config_dir, exist_ok=True)
+            with open(controllers_file, 'w', encoding='utf-8') as f:
+                f.write(CONTROLLERS_TEMPLATE)
+            self.log(f"未找到多控制器配置，已生成模板: {controllers_file}", "warning")
+            return
         
-        if self.connection_counter >= self.connection_threshold:
-            self.log(f"达到连接阈值({self.connection_threshold}次)，触发IP切换", "highlight")
+        try:
+            profiles = load_controller_profiles(controllers_file, self.get_blacklist())
+        except Exception as e:
+            self.log(f"读取多控制器配置失败: {e}", "error")
+            return
+        if not profiles:
+            self.log(f"多控制器配置中没有任何控制器: {controllers_file}", "warning")
+            return
+        
+        self.reset_used_proxies()
+        
+        self.start_button.setEnabled(False)
+        self.stop_button.setEnabled(True)
+        self.log(f"正在启动多控制器模式，共 {len(profiles)} 个控制器", "success")
+        
+        manager_class = AsyncMultiControllerManager if self.async_engine_checkbox.isChecked() else MultiControllerManager
+        self.multi_manager = MultiControllerBridge(manager_class(profiles, workers=max(self.concurrency_input.value(), 2 * len(profiles))))
+        self.multi_manager.log_signal.connect(self.log)
+        self.multi_manager.status_signal.connect(self.statusBar.showMessage)
+        self.multi_manager.used_proxy_update.connect(self.update_used_proxies)
+        self.multi_manager.running_changed.connect(self.on_multi_controller_stopped)
+        self.multi_manager.switch_completed.connect(self.update_trace_status)
+        self.multi_manager.start()
+        self.traced_switchers = self.multi_manager.manager.switchers()
+        self.trace_status_label.setText("")
+        self.start_control_server(self.multi_manager.manager.switchers())
+    
+    def on_multi_controller_stopped(self, running):
+        if running or self.multi_manager is None:
+            return
+        self.multi_manager.stop()
+        self.multi_manager = None
+        self.update_status(False)
+    
+    def on_connections_detected(self, count, samples, detected_at):
+        crossings = self.threshold_counter.add(count)
+        threshold = self.threshold_counter.threshold
+        
+        if crossings:
+            if self.switcher_thread and self.switcher_thread.switcher.paused:
+                self.log(f"达到连接阈值({threshold}次)，自动切换已暂停，忽略本次触发", "info")
+            elif crossings > 1:
+                self.log(f"达到连接阈值({threshold}次)，本批次共跨越阈值 {crossings} 次，触发IP切换", "highlight")
+            else:
+                self.log(f"达到连接阈值({threshold}次)，触发IP切换", "highlight")
             if self.switcher_thread and self.switcher_thread.isRunning():
-                self.switcher_thread.switch_proxy_now()
-            self.connection_counter = 0
-            self.update_connection_counter_label()
+                self.switcher_thread.switch_proxy_now(detected_at)
+        
+        self.update_connection_counter_label()
+    
+    def update_trace_status(self, *args):
+        recorders = [switcher.traces for switcher in self.traced_switchers.values()]
+        traces = [trace for recorder in recorders for trace in recorder.snapshot()]
+        total = recorders[0].summary(traces).get('total') if traces else None
+        if total:
+            scope = f"{len(recorders)}个控制器 " if len(recorders) > 1 else ""
+            self.trace_status_label.setText(
+                f"{scope}触发→切换完成: p50 {total['p50']:.0f}ms | p90 {total['p90']:.0f}ms | p99 {total['p99']:.0f}ms"
+            )
+    
+    def export_switch_traces(self):
+        recorders = {name: switcher.traces for name, switcher in self.traced_switchers.items()}
+        if not any(recorder.snapshot() for recorder in recorders.values()):
+            self.log("还没有可导出的切换追踪记录", "warning")
+            return
+        default_name = f"switch_traces_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        file_path, _ = QFileDialog.getSaveFileName(self, "导出切换追踪", default_name, "CSV文件 (*.csv);;所有文件 (*)")
+        if not file_path:
+            return
+        try:
+            count = export_switch_traces(file_path, recorders)
+            self.log(f"已导出 {count} 条切换追踪记录: {file_path}", "success")
+        except OSError as e:
+            self.log(f"导出切换追踪失败: {e}", "error")
+    
+    def on_poll_stats(self, interval, missed):
+        self.poll_status_label.setText(f"监控间隔: {interval:.2f}秒 | 估计漏检连接: {missed:.0f}")
     
     def update_connection_counter_label(self):
-        self.connection_counter_label.setText(f"当前连接计数: {self.connection_counter}")
+        self.connection_counter_label.setText(f"当前连接计数: {self.threshold_counter.counter}")
     
     def stop_switching(self):
+        if self.multi_manager is not None:
+            self.log("正在停止多控制器模式，请等待当前操作完成...", "highlight")
+            self.multi_manager.stop()
+            self.multi_manager = None
+            self.update_status(False)
+            return
+        
         if self.switcher_thread and self.switcher_thread.isRunning():
             self.switcher_thread.stop()
             self.log("正在停止代理切换，请等待当前操作完成...", "highlight")
@@ -1828,6 +2069,7 @@ class ClashAutoSwitcherGUI(QMainWindow):
                 }
             """)
         else:
+            self.stop_control_server()
             self.start_button.setEnabled(True)
             self.stop_button.setEnabled(False)
             self.statusBar.showMessage("已停止")
@@ -1919,6 +2161,13 @@ class ClashAutoSwitcherGUI(QMainWindow):
         if hasattr(self, 'snow_timer') and self.snow_timer.isActive():
             self.snow_timer.stop()
             
+        if self.multi_manager is not None:
+            self.multi_manager.stop()
+            self.multi_manager = None
+        
+        if self.control_server is not None:
+            self.control_server.stop()
+        
         if self.switcher_thread and self.switcher_thread.isRunning():
             self.switcher_thread.stop()
             self.switcher_thread.wait()
@@ -1927,6 +2176,9 @@ class ClashAutoSwitcherGUI(QMainWindow):
             self.monitor_thread.stop()
             self.monitor_thread.wait()
         
+        if self.controller_client is not None:
+            self.controller_client.close()
+        
         self.save_app_config()
         self.save_lists()
             
@@ -2027,51 +2279,70 @@ class ClashAutoSwitcherGUI(QMainWindow):
         for _ in range(count):
             self.snowflakes.append(Snowflake(self.width(), self.height()))
     
+    def snow_should_run(self):
+        return self.snow_enabled and self.isVisible() and not self.isMinimized()
+    
+    def refresh_snow_timer(self):
+        if not hasattr(self, 'snow_timer'):
+            return
+        if self.snow_should_run():
+            interval = int(1000 / self.snow_fps)
+            if not self.snow_timer.isActive() or self.snow_timer.interval() != interval:
+                self.snow_last_tick = time.perf_counter()
+                self.snow_timer.start(interval)
+        elif self.snow_timer.isActive():
+            self.snow_timer.stop()
+    
+    def on_snow_settings_changed(self, *args):
+        was_enabled = self.snow_enabled
+        self.snow_enabled = self.snow_checkbox.isChecked()
+        self.snow_fps = self.snow_fps_input.value()
+        self.snow_fps_input.setEnabled(self.snow_enabled)
+        self.refresh_snow_timer()
+        if was_enabled != self.snow_enabled:
+            self.update()
+    
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh_snow_timer()
+    
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.refresh_snow_timer()
+    
+    def changeEvent(self, event):
+        super().changeEvent(event)
+        if event.type() == QEvent.Type.WindowStateChange:
+            self.refresh_snow_timer()
+    
     def update_snow(self):
+        now = time.perf_counter()
+        step = min(now - self.snow_last_tick, 0.25) / 0.05
+        self.snow_last_tick = now
+        window = self.windowHandle()
+        if window is not None and not window.isExposed():
+            return
+        
+        dirty = QRegion()
         for snowflake in self.snowflakes:
-            snowflake.update()
-        self.update()
+            previous = snowflake.bounds()
+            snowflake.update(step)
+            dirty += previous.united(snowflake.bounds())
+        self.update(dirty)
     
     def paintEvent(self, event):
         super().paintEvent(event)
-        painter = QPainter(self)
-        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        if not self.snow_enabled:
+            return
         
+        area = event.region()
+        painter = QPainter(self)
         for snowflake in self.snowflakes:
-            painter.save()
-            
-            painter.setPen(Qt.PenStyle.NoPen)
-            painter.setBrush(QBrush(snowflake.color))
-            
-            painter.translate(QPoint(int(snowflake.x), int(snowflake.y)))
-            
-            if snowflake.shape_type == 0:
-                painter.drawEllipse(QPoint(0, 0), snowflake.size, snowflake.size)
-            
-            elif snowflake.shape_type == 1:
-                painter.rotate(snowflake.rotation)
-                size = snowflake.size
-                for i in range(6):
-                    painter.save()
-                    painter.rotate(60 * i)
-                    painter.drawLine(0, 0, 0, int(size * 2))
-                    painter.drawLine(0, int(size * 0.5), int(size * 0.5), int(size * 0.3))
-                    painter.drawLine(0, int(size * 0.5), -int(size * 0.5), int(size * 0.3))
-                    painter.drawLine(0, int(size), int(size * 0.7), int(size * 0.7))
-                    painter.drawLine(0, int(size), -int(size * 0.7), int(size * 0.7))
-                    painter.restore()
-            
-            elif snowflake.shape_type == 2:
-                painter.rotate(snowflake.rotation)
-                size = snowflake.size
-                points = []
-                for i in range(10):
-                    angle = 2 * 3.14159 * i / 10
-                    radius = size if i % 2 == 0 else size * 0.4
-                    points.append(QPoint(int(radius * math.cos(angle)), int(radius * math.sin(angle))))
-                painter.drawPolygon(points)
-            
-            painter.restore()
+            bounds = snowflake.bounds()
+            if not area.intersects(bounds):
+                continue
+            painter.setOpacity(snowflake.alpha / 255)
+            painter.drawPixmap(bounds.topLeft(), self.snow_sprites.sprite(snowflake))
 
     def resizeEvent(self, event):
         if hasattr(self, 'logo_frame'):
@@ -0,0 +1,153 @@
+import argparse
+import logging
+import os
+import signal
+import sys
+import threading
+
+from switcher_core import (SWITCH_LOGIC_NAMES, SWITCH_MODE_NAMES, FILTER_MODE_NAMES, ControllerProfile, ControlServer, MultiControllerManager, export_switch_traces,
+                           load_config, load_controller_profiles, read_list_file)
+from switcher_async import AsyncMultiControllerManager
+
+LOG_LEVELS = {
+    "error": logging.ERROR,
+    "warning": logging.WARNING,
+}
+
+
+def build_profiles(args):
+    blacklist = read_list_file(args.keyword_list) if args.keyword_list else None
+    if args.controllers:
+        return load_controller_profiles(args.controllers, blacklist)
+
+    controller = args.controller
+    secret = args.secret
+    if args.clash_config:
+        config_data = load_config(args.clash_config)
+        controller = controller or config_data['controller']
+        secret = secret if secret is not None else config_data['secret']
+
+    return [ControllerProfile(
+        args.name, controller or "127.0.0.1:9090", secret or "",
+        switch_mode=args.mode,
+        switch_logic=args.logic,
+        interval=args.interval,
+        threshold=args.threshold,
+        api_poll_interval=args.poll_interval,
+        use_stream=not args.no_stream,
+        filter_mode=args.filter_mode,
+        connection_list=read_list_file(args.target_list) if args.target_list else [],
+        blacklist=blacklist,
+        drain_connections=args.drain,
+        latency_cutoff=args.latency_cutoff,
+    )]
+
+
+def apply_record_path(profiles, path):
+    for profile in profiles:
+        if "{name}" in path:
+            profile.record_path = path.replace("{name}", profile.name)
+        elif len(profiles) > 1:
+            directory, filename = os.path.split(path)
+            profile.record_path = os.path.join(directory, f"{profile.name}-{filename}")
+        else:
+            profile.record_path = path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Clash 代理自动切换(无界面模式)")
+    parser.add_argument("--controllers", help="多控制器配置文件(controllers.ini 格式)，指定后忽略单控制器参数")
+    parser.add_argument("--clash-config", help="Clash 配置文件路径，从中读取控制器地址和密钥")
+    parser.add_argument("--controller", help="控制器地址，例如 127.0.0.1:9090")
+    parser.add_argument("--secret", help="控制器密钥")
+    parser.add_argument("--name", default="default", help="日志中显示的实例名称")
+    parser.add_argument("--mode", choices=list(SWITCH_MODE_NAMES), default="time")
+    parser.add_argument("--logic", choices=list(SWITCH_LOGIC_NAMES), default="random")
+    parser.add_argument("--interval", type=int, default=60, help="定时切换间隔(秒)")
+    parser.add_argument("--threshold", type=int, default=5, help="连接次数切换阈值")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="连接监控间隔(秒)")
+    parser.add_argument("--no-stream", action="store_true", help="禁用 WebSocket 推送，仅使用轮询")
+    parser.add_argument("--filter-mode", choices=list(FILTER_MODE_NAMES), default="blacklist")
+    parser.add_argument("--target-list", help="访问目标名单文件，每行一个域名、IP 或 CIDR")
+    parser.add_argument("--keyword-list", help="节点关键词黑名单文件，每行一个关键词")
+    parser.add_argument("--drain", action="store_true", help="切换后断开经过已切换代理组的旧连接")
+    parser.add_argument("--latency-cutoff", type=int, default=800, help="低延迟切换的延迟上限(毫秒)")
+    parser.add_argument("--engine", choices=["thread", "asyncio"], default="thread",
+                        help="thread: 每个监控/切换任务一个线程；asyncio: 所有控制器共用一个事件循环")
+    parser.add_argument("--control-port", type=int, default=0, help="本地控制API端口，0 表示不启用")
+    parser.add_argument("--control-host", default="127.0.0.1", help="本地控制API监听地址")
+    parser.add_argument("--control-token", default="", help="本地控制API的访问令牌(Authorization: Bearer <令牌>)")
+    parser.add_argument("--record-connections",
+                        help="将连接监控收到的 /connections 快照录制到 gzip 文件(多控制器时可用 {name} 占位)，供 benchmarks/replay_connections.py 回放")
+    parser.add_argument("--trace-file", help="退出时将各阶段的切换耗时追踪导出为 CSV 文件")
+    parser.add_argument("--log-file", help="日志文件路径，默认输出到标准输出")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        filename=args.log_file,
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format="%(asctime)s %(levelname)s %(message)s",
+    )
+    logger = logging.getLogger("clash_switcher")
+
+    try:
+        profiles = build_profiles(args)
+    except Exception as e:
+        logger.error(f"读取配置失败: {e}")
+        return 1
+    if not profiles:
+        logger.error(f"配置中没有任何控制器: {args.controllers}")
+        return 1
+    if args.record_connections:
+        apply_record_path(profiles, args.record_connections)
+
+    stop_event = threading.Event()
+    manager_class = AsyncMultiControllerManager if args.engine == "asyncio" else MultiControllerManager
+    manager = manager_class(profiles)
+    manager.log_signal.connect(lambda message, message_type: logger.log(LOG_LEVELS.get(message_type, logging.INFO), message))
+    manager.status_signal.connect(logger.debug)
+
+    def on_running_changed(running):
+        if not running:
+            stop_event.set()
+
+    manager.running_changed.connect(on_running_changed)
+
+    def handle_signal(signum, frame):
+        logger.info(f"收到信号 {signum}，正在停止...")
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+
+    logger.info(f"无界面模式启动，进程 {os.getpid()}，共 {len(profiles)} 个控制器")
+    control_server = None
+    if args.control_port:
+        control_server = ControlServer(manager.switchers, args.control_host, args.control_port, args.control_token)
+        try:
+            control_server.start()
+        except OSError as e:
+            logger.error(f"本地控制API启动失败({args.control_host}:{args.control_port}): {e}")
+            return 1
+        logger.info(f"本地控制API已启动: {control_server.address}")
+    manager.start()
+    while not stop_event.wait(1):
+        pass
+    if control_server:
+        control_server.stop()
+    manager.stop()
+    logger.info(manager.status_text())
+    if args.trace_file:
+        switchers = manager.switchers()
+        for name, switcher in switchers.items():
+            total = switcher.traces.summary().get('total')
+            if total:
+                logger.info(f"[{name}] 触发→切换完成 p50 {total['p50']:.1f}ms p90 {total['p90']:.1f}ms p99 {total['p99']:.1f}ms")
+        count = export_switch_traces(args.trace_file, {name: switcher.traces for name, switcher in switchers.items()})
+        logger.info(f"已导出 {count} 条切换追踪记录: {args.trace_file}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,397 @@
+import argparse
+import base64
+import hashlib
+import json
+import random
+import struct
+import threading
+import time
+import urllib.parse
+import uuid
+from datetime import datetime, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+DEFAULT_HOSTS = [
+    "ip.gs", "www.google.com", "api.github.com", "www.baidu.com",
+    "example.com", "cdn.jsdelivr.net", "www.bilibili.com", "httpbin.org",
+]
+
+
+class MockClashState:
+    def __init__(self, groups=3, nodes=50, churn=5.0, lifetime=3.0, hosts=None, seed=None,
+                 dead_ratio=0.2, delay_scale=0.1, latency=0.0, latency_jitter=0.0):
+        self.lock = threading.Lock()
+        self.random = random.Random(seed)
+        self.delay_scale = delay_scale
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.churn = churn
+        self.lifetime = lifetime
+        self.hosts = hosts or DEFAULT_HOSTS
+        self.proxies = {}
+        self.connections = {}
+        self.upload_total = 0
+        self.download_total = 0
+        self.put_count = 0
+        self.created_count = 0
+
+        node_names = [f"节点-{i:04d}" for i in range(nodes)]
+        self.delays = {
+            name: None if self.random.random() < dead_ratio else self.random.randint(30, 1500)
+            for name in node_names
+        }
+        for name in node_names:
+            self.proxies[name] = {"name": name, "type": "Shadowsocks", "udp": True, "history": []}
+        self.proxies["DIRECT"] = {"name": "DIRECT", "type": "Direct", "udp": True, "history": []}
+        self.proxies["REJECT"] = {"name": "REJECT", "type": "Reject", "udp": True, "history": []}
+        self.proxies["自动选择"] = {
+            "name": "自动选择", "type": "URLTest", "now": node_names[0] if node_names else "DIRECT",
+            "all": list(node_names), "history": [],
+        }
+
+        group_names = []
+        for i in range(groups):
+            group_name = f"分组-{i:02d}"
+            members = ["自动选择", "DIRECT"] + node_names
+            self.proxies[group_name] = {
+                "name": group_name, "type": "Selector", "now": members[0], "all": members, "history": [],
+            }
+            group_names.append(group_name)
+
+        global_members = ["DIRECT", "REJECT", "自动选择"] + group_names + node_names
+        self.proxies["GLOBAL"] = {
+            "name": "GLOBAL", "type": "Selector", "now": "DIRECT", "all": global_members, "history": [],
+        }
+        self.node_names = node_names
+
+    def proxies_document(self):
+        with self.lock:
+            return json.dumps({"proxies": self.proxies}, ensure_ascii=False)
+
+    def select(self, group_name, proxy_name):
+        with self.lock:
+            group = self.proxies.get(group_name)
+            if not group or group.get("type") != "Selector":
+                return 404
+            if proxy_name not in group["all"]:
+                return 400
+            group["now"] = proxy_name
+            self.put_count += 1
+            return 204
+
+    def delay(self, name):
+        with self.lock:
+            if name not in self.proxies:
+                return None, False
+            return self.delays.get(name, self.random.randint(30, 300)), True
+
+    def response_delay(self):
+        if self.latency <= 0 and self.latency_jitter <= 0:
+            return 0.0
+        with self.lock:
+            jitter = self.random.uniform(0, self.latency_jitter) if self.latency_jitter > 0 else 0.0
+        return (self.latency + jitter) / 1000
+
+    def new_connection(self, now):
+        host = self.random.choice(self.hosts)
+        node = self.random.choice(self.node_names) if self.node_names else "DIRECT"
+        conn_id = str(uuid.UUID(int=self.random.getrandbits(128), version=4))
+        return conn_id, {
+            "id": conn_id,
+            "metadata": {
+                "network": "tcp",
+                "type": "HTTP",
+                "sourceIP": "127.0.0.1",
+                "destinationIP": f"{self.random.randint(1, 223)}.{self.random.randint(0, 255)}."
+                                 f"{self.random.randint(0, 255)}.{self.random.randint(1, 254)}",
+                "sourcePort": str(self.random.randint(20000, 65000)),
+                "destinationPort": "443",
+                "host": host,
+                "dnsMode": "normal",
+                "processPath": "",
+            },
+            "upload": 0,
+            "download": 0,
+            "start": datetime.now(timezone.utc).isoformat(),
+            "chains": [node, "GLOBAL"],
+            "rule": "Match",
+            "rulePayload": "",
+            "_expires": now + self.random.expovariate(1.0 / self.lifetime) if self.lifetime > 0 else now,
+        }
+
+    def tick(self, dt):
+        now = time.time()
+        with self.lock:
+            expired = [conn_id for conn_id, conn in self.connections.items() if conn["_expires"] <= now]
+            for conn_id in expired:
+                del self.connections[conn_id]
+
+            expected = self.churn * dt
+            count = int(expected)
+            if self.random.random() < expected - count:
+                count += 1
+            for _ in range(count):
+                conn_id, conn = self.new_connection(now)
+                self.connections[conn_id] = conn
+            self.created_count += count
+
+            for conn in self.connections.values():
+                delta = self.random.randint(0, 4096)
+                conn["download"] += delta
+                self.download_total += delta
+
+    def close_connection(self, conn_id):
+        with self.lock:
+            if conn_id is None:
+                self.connections.clear()
+                return True
+            return self.connections.pop(conn_id, None) is not None
+
+    def connections_document(self):
+        with self.lock:
+            connections = [
+                {key: value for key, value in conn.items() if not key.startswith("_")}
+                for conn in self.connections.values()
+            ]
+            return json.dumps({
+                "downloadTotal": self.download_total,
+                "uploadTotal": self.upload_total,
+                "connections": connections,
+            }, ensure_ascii=False)
+
+
+def send_ws_frame(wfile, opcode, payload):
+    header = bytearray([0x80 | opcode])
+    length = len(payload)
+    if length < 126:
+        header.append(length)
+    elif length < 65536:
+        header.append(126)
+        header.extend(struct.pack("!H", length))
+    else:
+        header.append(127)
+        header.extend(struct.pack("!Q", length))
+    wfile.write(bytes(header) + payload)
+    wfile.flush()
+
+
+class MockClashHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def authorized(self, query):
+        secret = self.server.secret
+        if not secret:
+            return True
+        if self.headers.get("Authorization") == f"Bearer {secret}":
+            return True
+        return query.get("token", [""])[0] == secret
+
+    def send_json(self, status, body):
+        data = body.encode("utf-8") if isinstance(body, str) else json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_empty(self, status):
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def parse(self):
+        delay = self.server.state.response_delay()
+        if delay:
+            time.sleep(delay)
+        parsed = urllib.parse.urlparse(self.path)
+        return urllib.parse.unquote(parsed.path), urllib.parse.parse_qs(parsed.query)
+
+    def do_GET(self):
+        path, query = self.parse()
+        if not self.authorized(query):
+            self.send_json(401, {"message": "Unauthorized"})
+            return
+
+        if path == "/version":
+            self.send_json(200, {"version": "mock-controller", "premium": True})
+        elif path == "/proxies":
+            self.send_json(200, self.server.state.proxies_document())
+        elif path.startswith("/proxies/") and path.endswith("/delay"):
+            self.probe_delay(path[len("/proxies/"):-len("/delay")], query)
+        elif path == "/connections":
+            if self.headers.get("Upgrade", "").lower() == "websocket":
+                self.stream_connections(query)
+            else:
+                self.send_json(200, self.server.state.connections_document())
+        else:
+            self.send_json(404, {"message": "Resource not found"})
+
+    def do_PUT(self):
+        path, query = self.parse()
+        if not self.authorized(query):
+            self.send_json(401, {"message": "Unauthorized"})
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        if not path.startswith("/proxies/"):
+            self.send_json(404, {"message": "Resource not found"})
+            return
+        try:
+            name = json.loads(body or b"{}").get("name", "")
+        except ValueError:
+            self.send_json(400, {"message": "Body invalid"})
+            return
+
+        status = self.server.state.select(path[len("/proxies/"):], name)
+        if status == 204:
+            self.send_empty(204)
+        else:
+            self.send_json(status, {"message": "Selector update error"})
+
+    def probe_delay(self, name, query):
+        try:
+            timeout = int(query.get("timeout", ["5000"])[0])
+        except ValueError:
+            self.send_json(400, {"message": "Body invalid"})
+            return
+
+        delay, exists = self.server.state.delay(name)
+        if not exists:
+            self.send_json(404, {"message": "Resource not found"})
+            return
+
+        wait_ms = timeout if delay is None or delay > timeout else delay
+        time.sleep(wait_ms / 1000 * self.server.state.delay_scale)
+        if delay is None or delay > timeout:
+            self.send_json(408, {"message": "Timeout"})
+        else:
+            self.send_json(200, {"delay": delay})
+
+    def do_DELETE(self):
+        path, query = self.parse()
+        if not self.authorized(query):
+            self.send_json(401, {"message": "Unauthorized"})
+            return
+
+        if path == "/connections":
+            self.server.state.close_connection(None)
+            self.send_empty(204)
+        elif path.startswith("/connections/"):
+            self.server.state.close_connection(path[len("/connections/"):])
+            self.send_empty(204)
+        else:
+            self.send_json(404, {"message": "Resource not found"})
+
+    def stream_connections(self, query):
+        if not self.server.enable_websocket:
+            self.send_json(400, {"message": "WebSocket disabled"})
+            return
+
+        key = self.headers.get("Sec-WebSocket-Key", "")
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        self.send_response(101, "Switching Protocols")
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept", accept)
+        self.end_headers()
+        self.wfile.flush()
+
+        try:
+            interval = max(int(query.get("interval", ["1000"])[0]), 10) / 1000
+        except ValueError:
+            interval = 1.0
+
+        self.close_connection = True
+        try:
+            while not self.server.stopping.is_set():
+                payload = self.server.state.connections_document().encode("utf-8")
+                send_ws_frame(self.wfile, 0x1, payload)
+                if self.server.stopping.wait(interval):
+                    break
+            send_ws_frame(self.wfile, 0x8, struct.pack("!H", 1001))
+        except (BrokenPipeError, ConnectionResetError, OSError):
+            pass
+
+
+class MockClashController:
+    def __init__(self, host="127.0.0.1", port=0, secret="", enable_websocket=True, verbose=False, **state_options):
+        self.state = MockClashState(**state_options)
+        self.server = ThreadingHTTPServer((host, port), MockClashHandler)
+        self.server.daemon_threads = True
+        self.server.state = self.state
+        self.server.secret = secret
+        self.server.enable_websocket = enable_websocket
+        self.server.verbose = verbose
+        self.server.stopping = threading.Event()
+        self.threads = []
+
+    @property
+    def address(self):
+        host, port = self.server.server_address[:2]
+        return f"{host}:{port}"
+
+    def churn_loop(self):
+        last = time.time()
+        while not self.server.stopping.wait(0.05):
+            now = time.time()
+            self.state.tick(now - last)
+            last = now
+
+    def start(self):
+        for target in (self.server.serve_forever, self.churn_loop):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def stop(self):
+        self.server.stopping.set()
+        self.server.shutdown()
+        self.server.server_close()
+        for thread in self.threads:
+            thread.join(timeout=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="用于离线测试的模拟Clash控制器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9090)
+    parser.add_argument("--secret", default="")
+    parser.add_argument("--groups", type=int, default=3, help="Selector代理组数量")
+    parser.add_argument("--nodes", type=int, default=50, help="代理节点数量")
+    parser.add_argument("--churn", type=float, default=5.0, help="每秒新建连接数")
+    parser.add_argument("--lifetime", type=float, default=3.0, help="连接平均存活时间(秒)")
+    parser.add_argument("--no-websocket", action="store_true", help="禁用WebSocket推送以测试轮询回退")
+    parser.add_argument("--dead-ratio", type=float, default=0.2, help="延迟测试超时的节点比例")
+    parser.add_argument("--delay-scale", type=float, default=0.1, help="延迟测试实际等待时间相对模拟延迟的比例")
+    parser.add_argument("--latency", type=float, default=0.0, help="每个API请求注入的固定延迟(毫秒)")
+    parser.add_argument("--latency-jitter", type=float, default=0.0, help="在固定延迟之上叠加的随机延迟上限(毫秒)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    controller = MockClashController(
+        args.host, args.port, args.secret,
+        enable_websocket=not args.no_websocket, verbose=args.verbose,
+        groups=args.groups, nodes=args.nodes, churn=args.churn,
+        lifetime=args.lifetime, seed=args.seed,
+        dead_ratio=args.dead_ratio, delay_scale=args.delay_scale,
+        latency=args.latency, latency_jitter=args.latency_jitter,
+    ).start()
+    print(f"模拟Clash控制器已启动: http://{controller.address}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        controller.stop()
+
+
+if __name__ == "__main__":
+    main()
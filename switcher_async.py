@@ -0,0 +1,662 @@
+import asyncio
+import base64
+import json
+import os
+import ssl
+import struct
+import threading
+import time
+import urllib.parse
+
+from switcher_core import (ClashWebSocket, ConnectionMonitor, ConnectionRecorder, ControllerStats, DelayProber,
+                           MultiControllerManager, ProxySwitcher, ProxyTopologyCache, json_loads,
+                           normalize_controller_url, parse_proxies_document)
+
+
+class AsyncResponse:
+    def __init__(self, status_code, content):
+        self.status_code = status_code
+        self.content = content
+
+    def json(self):
+        return json_loads(self.content)
+
+
+class AsyncControllerClient(ControllerStats):
+    def __init__(self, controller_address, secret='', timeout=5, pool_size=32):
+        super().__init__()
+        self.base_url = normalize_controller_url(controller_address).rstrip('/')
+        self.secret = secret
+        self.timeout = timeout
+        self.headers = {"Authorization": f"Bearer {secret}"} if secret else {}
+        self.pool_size = pool_size
+
+        parsed = urllib.parse.urlparse(self.base_url)
+        self.secure = parsed.scheme == 'https'
+        self.host = parsed.hostname or '127.0.0.1'
+        self.port = parsed.port or (443 if self.secure else 80)
+        self.base_path = parsed.path.rstrip('/')
+
+        self.idle = []
+        self.semaphore = None
+
+    async def request(self, method, path, params=None, json=None, timeout=None):
+        start = time.perf_counter()
+        failed = False
+        try:
+            response = await asyncio.wait_for(self.send(method, path, params, json), timeout or self.timeout)
+            failed = response.status_code >= 400
+            return response
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.record(time.perf_counter() - start, failed)
+
+    async def get(self, path, **kwargs):
+        return await self.request("GET", path, **kwargs)
+
+    async def put(self, path, **kwargs):
+        return await self.request("PUT", path, **kwargs)
+
+    async def delete(self, path, **kwargs):
+        return await self.request("DELETE", path, **kwargs)
+
+    def build_request(self, method, path, params, payload):
+        target = f"{self.base_path}{path}"
+        if params:
+            target += "?" + urllib.parse.urlencode(params)
+        body = b""
+        lines = [
+            f"{method} {target} HTTP/1.1",
+            f"Host: {self.host}:{self.port}",
+            "Accept: */*",
+            "Connection: keep-alive",
+        ]
+        for name, value in self.headers.items():
+            lines.append(f"{name}: {value}")
+        if payload is not None:
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            lines.append("Content-Type: application/json")
+        if body or method in ("PUT", "POST"):
+            lines.append(f"Content-Length: {len(body)}")
+        return ("\r\n".join(lines) + "\r\n\r\n").encode('utf-8') + body
+
+    async def send(self, method, path, params, payload):
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.pool_size)
+        data = self.build_request(method, path, params, payload)
+
+        async with self.semaphore:
+            while True:
+                reused = bool(self.idle)
+                if reused:
+                    reader, writer = self.idle.pop()
+                else:
+                    reader, writer = await asyncio.open_connection(
+                        self.host, self.port, ssl=ssl.create_default_context() if self.secure else None
+                    )
+                try:
+                    writer.write(data)
+                    await writer.drain()
+                    status_code, content, keep_alive = await self.read_response(reader, method)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    writer.close()
+                    if reused:
+                        continue
+                    raise
+                except BaseException:
+                    writer.close()
+                    raise
+
+                if keep_alive:
+                    self.idle.append((reader, writer))
+                else:
+                    writer.close()
+                return AsyncResponse(status_code, content)
+
+    async def read_response(self, reader, method):
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError("控制器关闭了连接")
+        parts = status_line.decode('latin-1').strip().split(" ", 2)
+        if len(parts) < 2:
+            raise ConnectionError(f"无效的HTTP状态行: {status_line!r}")
+        version = parts[0]
+        status_code = int(parts[1])
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode('latin-1').partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        keep_alive = version == "HTTP/1.1" and headers.get('connection', '').lower() != 'close'
+        if method == "HEAD" or status_code in (204, 304) or 100 <= status_code < 200:
+            return status_code, b"", keep_alive
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";")[0].strip(), 16)
+                if size == 0:
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            return status_code, b"".join(chunks), keep_alive
+
+        if 'content-length' in headers:
+            return status_code, await reader.readexactly(int(headers['content-length'])), keep_alive
+
+        return status_code, await reader.read(), False
+
+    async def aclose(self):
+        idle, self.idle = self.idle, []
+        for reader, writer in idle:
+            writer.close()
+
+
+class AsyncClashWebSocket(ClashWebSocket):
+    def __init__(self, url, headers=None, timeout=5):
+        super().__init__(url, headers, timeout)
+        self.reader = None
+        self.writer = None
+
+    async def connect(self):
+        secure, host, port, path = self.endpoint()
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port, ssl=ssl.create_default_context() if secure else None),
+            self.timeout
+        )
+
+        key = base64.b64encode(os.urandom(16)).decode()
+        writer.write(self.handshake_request(host, port, path, key))
+        try:
+            await writer.drain()
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), self.timeout)
+            self.verify_handshake(head[:-4], key)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            writer.close()
+            raise ConnectionError("WebSocket握手时连接被关闭")
+        except BaseException:
+            writer.close()
+            raise
+
+        self.reader = reader
+        self.writer = writer
+        self.buffer = bytearray()
+        self.fragments = []
+
+    async def send_frame(self, opcode, payload=b""):
+        self.writer.write(self.build_frame(opcode, payload))
+        await self.writer.drain()
+
+    async def recv_message(self):
+        while True:
+            frame = self.parse_frame()
+            if frame is None:
+                chunk = await self.reader.read(65536)
+                if not chunk:
+                    raise ConnectionError("WebSocket连接已关闭")
+                self.buffer.extend(chunk)
+                continue
+
+            fin, opcode, payload = frame
+            if opcode == 0x8:
+                try:
+                    await self.send_frame(0x8, payload[:2])
+                except Exception:
+                    pass
+                raise ConnectionError("WebSocket连接已被控制器关闭")
+            if opcode == 0x9:
+                await self.send_frame(0xA, payload)
+                continue
+
+            message = self.handle_data_frame(fin, opcode, payload)
+            if message is not None:
+                return message
+
+    def abort(self):
+        if self.writer:
+            self.writer.transport.abort()
+
+    async def close(self):
+        if self.writer:
+            try:
+                await self.send_frame(0x8, struct.pack("!H", 1000))
+            except Exception:
+                pass
+            self.writer.close()
+            self.writer = None
+            self.reader = None
+
+
+async def wait_event(event, timeout):
+    try:
+        await asyncio.wait_for(event.wait(), timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+
+class AsyncProxyTopologyCache(ProxyTopologyCache):
+    def __init__(self, client, blacklist=None, refresh_interval=60):
+        super().__init__(client, blacklist, refresh_interval)
+        self.task = None
+
+    async def refresh(self):
+        try:
+            response = await self.client.get("/proxies")
+            if response.status_code != 200:
+                self.log_signal.emit(f"获取代理列表失败: HTTP {response.status_code}", "error")
+                return False
+            proxy_names, available_groups = parse_proxies_document(response.json())
+        except Exception as e:
+            self.log_signal.emit(f"获取代理信息时出错: {e}", "error")
+            return False
+        return self.apply_groups(available_groups)
+
+    async def get_groups(self):
+        if self.stale or not self.groups:
+            await self.refresh()
+        return self.snapshot()
+
+    async def switchable_groups(self):
+        return [group for group in await self.get_groups() if self.is_switchable(group)]
+
+    def start(self):
+        self.running = True
+        self.refresh_event = asyncio.Event()
+        self.task = asyncio.ensure_future(self.refresh_loop())
+
+    async def refresh_loop(self):
+        while self.running:
+            await wait_event(self.refresh_event, self.refresh_interval)
+            self.refresh_event.clear()
+            if not self.running:
+                break
+            try:
+                await self.refresh()
+            except Exception as e:
+                self.log_signal.emit(f"后台刷新代理拓扑时出错: {e}", "error")
+
+    def stop(self):
+        self.running = False
+        if self.task:
+            self.task.cancel()
+
+
+class AsyncDelayProber(DelayProber):
+    def __init__(self, client, **kwargs):
+        super().__init__(client, **kwargs)
+        self.task = None
+
+    async def probe(self, name):
+        if not self.running:
+            return None
+        delay = None
+        try:
+            response = await self.client.get(
+                f"/proxies/{urllib.parse.quote(name, safe='')}/delay",
+                params={"timeout": self.timeout_ms, "url": self.test_url},
+                timeout=self.timeout_ms / 1000 + 2
+            )
+            if response.status_code == 200:
+                delay = response.json().get('delay') or None
+        except Exception:
+            delay = None
+        return self.record(name, delay)
+
+    async def probe_stale(self):
+        stale = self.stale_candidates()
+        if stale:
+            semaphore = asyncio.Semaphore(self.max_workers)
+
+            async def bounded_probe(name):
+                async with semaphore:
+                    return await self.probe(name)
+
+            await asyncio.gather(*(bounded_probe(name) for name in stale))
+        return len(stale)
+
+    async def probe_loop(self):
+        while self.running:
+            try:
+                await self.probe_stale()
+            except Exception as e:
+                self.log_signal.emit(f"节点延迟探测时出错: {e}", "error")
+            await wait_event(self.wake_event, self.probe_interval)
+            self.wake_event.clear()
+
+    def start(self):
+        self.running = True
+        self.wake_event = asyncio.Event()
+        self.task = asyncio.ensure_future(self.probe_loop())
+
+    def stop(self):
+        self.running = False
+        if self.task:
+            self.task.cancel()
+
+
+class AsyncConnectionMonitor(ConnectionMonitor):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.loop = None
+
+    async def run_async(self):
+        self.stop_event = asyncio.Event()
+        self.loop = asyncio.get_running_loop()
+        self.log_settings()
+
+        try:
+            while self.running:
+                if self.use_stream:
+                    await self.run_stream()
+                if self.running:
+                    await self.run_poll(self.poll_deadline())
+        except Exception as e:
+            self.log_signal.emit(f"连接监控异常: {e}", "error")
+        finally:
+            self.close_recorder()
+
+    async def run_poll(self, deadline=None):
+        last_poll_time = time.time()
+        while self.running and (deadline is None or time.time() < deadline):
+            poll_time = time.time()
+            try:
+                response = await self.client.get("/connections")
+                if self.handle_poll_response(response.status_code, response.content, poll_time, last_poll_time):
+                    last_poll_time = poll_time
+            except Exception as e:
+                self.log_signal.emit(f"监控连接时出错: {e}", "error")
+
+            await wait_event(self.stop_event, self.current_interval)
+
+    async def run_stream(self):
+        self.websocket = AsyncClashWebSocket(self.stream_url(), self.client.headers)
+        try:
+            await self.websocket.connect()
+        except Exception as e:
+            self.websocket = None
+            self.log_signal.emit(f"WebSocket推送不可用({e})，回退到轮询模式，{self.stream_retry_delay}秒后重试", "warning")
+            return
+
+        self.log_signal.emit("已订阅控制器的WebSocket连接推送", "success")
+
+        try:
+            while self.running:
+                message = await self.websocket.recv_message()
+                try:
+                    self.process_payload(message, time.time())
+                    self.stream_retry_delay = self.STREAM_RETRY_MIN
+                except ValueError as e:
+                    self.log_signal.emit(f"解析WebSocket推送数据时出错: {e}", "error")
+        except Exception as e:
+            if self.running:
+                self.log_signal.emit(f"WebSocket推送中断({e})，回退到轮询模式，{self.stream_retry_delay}秒后重试", "warning")
+        finally:
+            if self.websocket:
+                await self.websocket.close()
+                self.websocket = None
+
+    def interrupt(self):
+        self.stop_event.set()
+        if self.websocket:
+            self.websocket.abort()
+
+    def stop(self):
+        self.running = False
+        if self.loop and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.interrupt)
+
+
+class AsyncProxySwitcher(ProxySwitcher):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.loop = None
+        self.put_semaphore = None
+        self.drain_semaphore = None
+        self.engine_semaphore = None
+        self.drain_task = None
+
+    def create_topology(self, refresh_interval):
+        return AsyncProxyTopologyCache(self.client, self.blacklist, refresh_interval)
+
+    def create_prober(self, max_workers):
+        return AsyncDelayProber(self.client, max_workers=max_workers)
+
+    def wake(self):
+        if self.loop and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.switch_event.set)
+
+    async def run_async(self):
+        self.switch_event = asyncio.Event()
+        self.stop_event = asyncio.Event()
+        self.put_semaphore = asyncio.Semaphore(self.switch_concurrency)
+        self.drain_semaphore = asyncio.Semaphore(self.switch_concurrency)
+        self.loop = asyncio.get_running_loop()
+        if self.auto_triggered or self.switch_requests:
+            self.switch_event.set()
+        self.log_settings()
+
+        self.topology.start()
+        if self.prober:
+            self.prober.set_candidates(await self.candidate_names())
+            self.prober.start()
+
+        try:
+            next_switch_time = time.time() + self.interval
+
+            if self.switch_mode == "connection":
+                self.log_signal.emit(f"等待连接次数达到阈值后进行切换...", "info")
+
+            self.status_update.emit(True)
+
+            while self.running:
+                if self.switch_mode == "time":
+                    await wait_event(self.switch_event, max(0.0, next_switch_time - time.time()))
+                else:
+                    await self.switch_event.wait()
+                self.switch_event.clear()
+
+                if not self.running:
+                    break
+
+                deadline_reached = self.switch_mode == "time" and time.time() >= next_switch_time
+                switch_requests, automatic, group_filter, trace = self.take_switch_requests(deadline_reached)
+                if not automatic and not switch_requests:
+                    if deadline_reached:
+                        next_switch_time = time.time() + self.interval
+                    continue
+
+                available_groups = await self.topology.switchable_groups()
+                trace.mark('topology')
+
+                if not available_groups:
+                    self.log_signal.emit("未找到任何可用的代理组。请确保Clash for Windows正在运行。", "warning")
+                    self.topology.invalidate()
+                    self.finish_switch_requests(switch_requests, [], [])
+                    await wait_event(self.stop_event, 5)
+                    next_switch_time = time.time()
+                    continue
+
+                if group_filter is not None:
+                    available_groups = [group for group in available_groups if group['name'] in group_filter]
+
+                if self.prober:
+                    self.prober.set_candidates(await self.candidate_names())
+
+                planned = self.plan_selections(available_groups)
+                trace.mark('selection')
+
+                switch_start = time.perf_counter()
+                trace.mark('put_sent')
+                results = await asyncio.gather(*(self.put_selection(plan) for plan in planned))
+                switch_elapsed = (time.perf_counter() - switch_start) * 1000
+                if planned:
+                    self.record_trace(trace)
+
+                switched_groups = self.report_results(planned, results, switch_elapsed)
+                self.finish_switch_requests(switch_requests, planned, results)
+
+                if switched_groups and self.drain_connections:
+                    self.schedule_drain(switched_groups)
+
+                if automatic:
+                    next_switch_time = self.next_switch_time(switched_groups)
+
+        except Exception as e:
+            self.log_signal.emit(f"异常: {e}", "error")
+        finally:
+            self.running = False
+            self.abort_switch_requests("切换线程已停止")
+            self.topology.stop()
+            if self.drain_task:
+                self.drain_task.cancel()
+            if self.prober:
+                self.prober.stop()
+            self.log_signal.emit(self.client.stats_text(), "info")
+            self.status_update.emit(False)
+
+    def schedule_drain(self, switched_groups):
+        self.drain_pending |= switched_groups
+        if self.drain_task is None:
+            self.drain_task = asyncio.ensure_future(self.drain_loop())
+
+    async def drain_loop(self):
+        try:
+            while self.running and self.drain_pending:
+                switched_groups = self.drain_pending
+                self.drain_pending = set()
+                try:
+                    await self.drain_stale_connections(switched_groups)
+                except Exception as e:
+                    self.log_signal.emit(f"断开旧连接失败: {e}", "error")
+        finally:
+            self.drain_task = None
+
+    async def drain_stale_connections(self, switched_groups):
+        drain_start = time.perf_counter()
+        try:
+            response = await self.client.get("/connections")
+            if response.status_code != 200:
+                self.log_signal.emit(f"断开旧连接失败: 获取连接信息返回 HTTP {response.status_code}", "warning")
+                return
+            stale_ids = self.stale_connection_ids(response.content, switched_groups)
+        except Exception as e:
+            self.log_signal.emit(f"断开旧连接失败: {e}", "error")
+            return
+
+        closed = 0
+        for offset in range(0, len(stale_ids), self.drain_batch_size):
+            if not self.running:
+                break
+            batch = stale_ids[offset:offset + self.drain_batch_size]
+            closed += sum(await asyncio.gather(*(self.close_connection(conn_id) for conn_id in batch)))
+
+        self.log_drain(closed, stale_ids, drain_start)
+
+    async def close_connection(self, conn_id):
+        try:
+            async with self.drain_semaphore:
+                response = await self.client.delete(f"/connections/{urllib.parse.quote(conn_id, safe='')}")
+            return 1 if response.status_code in [200, 204] else 0
+        except Exception:
+            return 0
+
+    async def candidate_names(self):
+        names = []
+        for group in await self.topology.switchable_groups():
+            names.extend(self.topology.filtered_proxies(group['name']))
+        return names
+
+    async def limited(self, method, *args, **kwargs):
+        if self.engine_semaphore is None:
+            return await method(*args, **kwargs)
+        async with self.engine_semaphore:
+            return await method(*args, **kwargs)
+
+    async def put_selection(self, plan):
+        group_name, old_selection, selected, total = plan
+        try:
+            async with self.put_semaphore:
+                response = await self.limited(self.client.put, f"/proxies/{urllib.parse.quote(group_name)}", json={"name": selected})
+        except Exception as e:
+            self.topology.invalidate()
+            return None, e
+        return self.apply_put_result(group_name, selected, response.status_code)
+
+    def interrupt(self):
+        self.stop_event.set()
+        self.switch_event.set()
+
+    def stop(self):
+        with self.request_lock:
+            self.running = False
+        if self.loop and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.interrupt)
+        self.log_signal.emit("正在停止代理切换...", "highlight")
+
+
+async def run_engines(switchers, monitors, workers=None):
+    if workers:
+        engine_semaphore = asyncio.Semaphore(workers)
+        for switcher in switchers:
+            switcher.engine_semaphore = engine_semaphore
+    try:
+        await asyncio.gather(
+            *(switcher.run_async() for switcher in switchers),
+            *(monitor.run_async() for monitor in monitors),
+        )
+    finally:
+        for switcher in switchers:
+            await switcher.client.aclose()
+
+
+class AsyncMultiControllerManager(MultiControllerManager):
+    def __init__(self, profiles, pool_size=64, workers=16):
+        super().__init__(profiles, pool_size, workers)
+        self.thread = None
+
+    def start(self):
+        for profile in self.profiles:
+            client = AsyncControllerClient(profile.controller, profile.secret, pool_size=max(4, self.pool_size // max(1, len(self.profiles))))
+            switcher = AsyncProxySwitcher(
+                profile.interval, "", profile.secret, profile.controller, profile.blacklist,
+                profile.switch_mode, profile.switch_logic, client,
+                switch_concurrency=profile.switch_concurrency,
+                latency_cutoff=profile.latency_cutoff,
+                drain_connections=profile.drain_connections,
+                name=profile.name,
+            )
+            monitor = None
+            if profile.switch_mode == "connection":
+                monitor = AsyncConnectionMonitor(
+                    profile.controller, profile.secret, profile.api_poll_interval, profile.filter_mode,
+                    profile.connection_list, profile.use_stream, client, name=profile.name,
+                    recorder=ConnectionRecorder(profile.record_path, profile.controller) if profile.record_path else None,
+                )
+            self.add_instance(profile, client, switcher, monitor)
+
+        self.launch()
+
+    def launch(self):
+        switchers = [instance['switcher'] for instance in self.instances.values()]
+        monitors = [instance['monitor'] for instance in self.instances.values() if instance['monitor']]
+        self.thread = threading.Thread(target=asyncio.run, args=(run_engines(switchers, monitors, self.workers),), name="async-engine", daemon=True)
+        self.thread.start()
+        self.emit_status()
+
+    def stop(self):
+        for instance in self.instances.values():
+            if instance['monitor']:
+                instance['monitor'].stop()
+            instance['switcher'].stop()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
@@ -0,0 +1,2376 @@
+import os
+import math
+import time
+import csv
+import gzip
+import configparser
+import yaml
+import random
+import socket
+import ssl
+import base64
+import hashlib
+import struct
+import json
+import re
+import bisect
+import ipaddress
+import urllib.parse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import requests
+from requests.adapters import HTTPAdapter
+from datetime import datetime
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+json_loads = orjson.loads if orjson is not None else json.loads
+
+SWITCH_LOGIC_NAMES = {
+    "random": "随机切换",
+    "sequential": "逻辑切换",
+    "latency": "低延迟切换",
+}
+
+SWITCH_MODE_NAMES = {
+    "time": "定时切换",
+    "connection": "连接次数切换",
+}
+
+FILTER_MODE_NAMES = {
+    "blacklist": "黑名单",
+    "whitelist": "白名单",
+}
+
+
+class Signal:
+    def __init__(self):
+        self.handlers = []
+    
+    def connect(self, handler):
+        self.handlers.append(handler)
+    
+    def emit(self, *args):
+        for handler in self.handlers:
+            handler(*args)
+
+
+class CounterValue:
+    __slots__ = ('value',)
+    
+    def __init__(self):
+        self.value = 0
+    
+    def inc(self, amount=1):
+        self.value += amount
+    
+    def samples(self, name, labels):
+        yield name, labels, self.value
+
+
+class GaugeValue(CounterValue):
+    __slots__ = ()
+    
+    def set(self, value):
+        self.value = value
+
+
+class HistogramValue:
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+    
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+    
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+    
+    def samples(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            yield f"{name}_bucket", labels + (('le', format_metric_value(bound)),), cumulative
+        yield f"{name}_bucket", labels + (('le', "+Inf"),), cumulative + self.counts[-1]
+        yield f"{name}_sum", labels, self.sum
+        yield f"{name}_count", labels, self.count
+
+
+def format_metric_value(value):
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricFamily:
+    def __init__(self, name, help_text, kind, factory):
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self.factory = factory
+        self.children = {}
+        self.lock = threading.Lock()
+    
+    def labels(self, **labels):
+        key = tuple(sorted(labels.items()))
+        child = self.children.get(key)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(key, self.factory())
+        return child
+    
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in list(self.children.items()):
+            for sample_name, labels, value in child.samples(self.name, key):
+                label_text = ",".join(f'{label}="{escape_label_value(label_value)}"' for label, label_value in labels)
+                label_text = f"{{{label_text}}}" if label_text else ""
+                lines.append(f"{sample_name}{label_text} {format_metric_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+    SIZE_BUCKETS = (1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 50000)
+    
+    def __init__(self):
+        self.families = {}
+        self.lock = threading.Lock()
+    
+    def family(self, name, help_text, kind, factory):
+        family = self.families.get(name)
+        if family is None:
+            with self.lock:
+                family = self.families.setdefault(name, MetricFamily(name, help_text, kind, factory))
+        return family
+    
+    def counter(self, name, help_text):
+        return self.family(name, help_text, "counter", CounterValue)
+    
+    def gauge(self, name, help_text):
+        return self.family(name, help_text, "gauge", GaugeValue)
+    
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        bounds = tuple(sorted(buckets))
+        return self.family(name, help_text, "histogram", lambda: HistogramValue(bounds))
+    
+    def render(self):
+        lines = []
+        for family in list(self.families.values()):
+            lines.extend(family.render())
+        return "\n".join(lines) + "\n"
+
+
+default_registry = MetricsRegistry()
+
+def load_config(config_path):
+    try:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            config = yaml.safe_load(f)
+        
+        controller = config.get('external-controller', '127.0.0.1:9090')
+        secret = config.get('secret', '')
+        
+        return {
+            'controller': controller,
+            'secret': secret
+        }
+    except Exception as e:
+        print(f"加载配置文件时出错: {e}")
+        return {
+            'controller': '127.0.0.1:9090',
+            'secret': ''
+        }
+
+def normalize_controller_url(controller_address):
+    if not controller_address.startswith("http://") and not controller_address.startswith("https://"):
+        return f"http://{controller_address}"
+    return controller_address
+
+
+class ControllerStats:
+    def __init__(self):
+        self.stats_lock = threading.Lock()
+        self.request_count = 0
+        self.error_count = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.request_metric = None
+        self.error_metric = None
+        self.latency_metric = None
+    
+    def bind_metrics(self, registry, name):
+        self.request_metric = registry.counter("clash_controller_requests_total", "发往Clash控制器的请求数").labels(controller=name)
+        self.error_metric = registry.counter("clash_controller_errors_total", "失败或返回错误状态码的控制器请求数").labels(controller=name)
+        self.latency_metric = registry.histogram("clash_controller_request_duration_seconds", "控制器请求耗时").labels(controller=name)
+    
+    def record(self, elapsed, failed):
+        with self.stats_lock:
+            self.request_count += 1
+            self.total_time += elapsed
+            if elapsed > self.max_time:
+                self.max_time = elapsed
+            if failed:
+                self.error_count += 1
+            if self.request_metric is not None:
+                self.request_metric.inc()
+                self.latency_metric.observe(elapsed)
+                if failed:
+                    self.error_metric.inc()
+    
+    def stats(self):
+        with self.stats_lock:
+            count = self.request_count
+            return {
+                'requests': count,
+                'errors': self.error_count,
+                'avg_ms': (self.total_time / count * 1000) if count else 0.0,
+                'max_ms': self.max_time * 1000,
+            }
+    
+    def stats_text(self):
+        stats = self.stats()
+        return (f"控制器请求统计: 共 {stats['requests']} 次, 失败 {stats['errors']} 次, "
+                f"平均耗时 {stats['avg_ms']:.1f}ms, 最大耗时 {stats['max_ms']:.1f}ms")
+
+
+class ControllerClient(ControllerStats):
+    def __init__(self, controller_address, secret='', timeout=5, pool_size=32, session=None):
+        super().__init__()
+        self.base_url = normalize_controller_url(controller_address).rstrip('/')
+        self.secret = secret
+        self.timeout = timeout
+        self.headers = {"Authorization": f"Bearer {secret}"} if secret else {}
+        
+        self.owns_session = session is None
+        self.session = session or self.create_session(pool_size)
+    
+    @staticmethod
+    def create_session(pool_size=32, pool_connections=4):
+        session = requests.Session()
+        session.trust_env = False
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+    
+    def request(self, method, path, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        kwargs.setdefault('headers', self.headers)
+        start = time.perf_counter()
+        failed = False
+        try:
+            response = self.session.request(method, f"{self.base_url}{path}", **kwargs)
+            failed = response.status_code >= 400
+            return response
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.record(time.perf_counter() - start, failed)
+    
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+    
+    def put(self, path, **kwargs):
+        return self.request("PUT", path, **kwargs)
+    
+    def delete(self, path, **kwargs):
+        return self.request("DELETE", path, **kwargs)
+    
+    def close(self):
+        if self.owns_session:
+            self.session.close()
+
+
+def get_proxies_and_groups(api_url, secret, client=None):
+    owns_client = client is None
+    if owns_client:
+        client = ControllerClient(api_url, secret)
+    
+    try:
+        proxies_response = client.get("/proxies")
+        if proxies_response.status_code != 200:
+            raise ConnectionError(f"/proxies 返回 HTTP {proxies_response.status_code}")
+        return parse_proxies_document(proxies_response.json())
+    finally:
+        if owns_client:
+            client.close()
+
+
+def parse_proxies_document(proxies_data):
+    proxy_names = []
+    for name, details in proxies_data.get('proxies', {}).items():
+        if details.get('type') == 'Proxy':
+            proxy_names.append(name)
+    
+    available_groups = []
+    for name, details in proxies_data.get('proxies', {}).items():
+        if details.get('type') in ['Selector', 'URLTest', 'Fallback']:
+            group_info = {
+                'name': name,
+                'type': details.get('type'),
+                'now': details.get('now', ''),
+                'all': details.get('all', [])
+            }
+            available_groups.append(group_info)
+    
+    return proxy_names, available_groups
+
+
+class DomainSuffixTrie:
+    def __init__(self, domains=()):
+        self.root = {}
+        for domain in domains:
+            self.add(domain)
+    
+    def add(self, domain):
+        node = self.root
+        for label in reversed(domain.split('.')):
+            node = node.setdefault(label, {})
+        node[None] = True
+    
+    def match(self, host):
+        node = self.root
+        for label in reversed(host.split('.')):
+            node = node.get(label)
+            if node is None:
+                return False
+            if None in node:
+                return True
+        return False
+
+
+class AhoCorasick:
+    def __init__(self, patterns=()):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [False]
+        for pattern in patterns:
+            self.add(pattern)
+        self.build()
+    
+    def add(self, pattern):
+        state = 0
+        for ch in pattern:
+            next_state = self.goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][ch] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append(False)
+            state = next_state
+        self.out[state] = True
+    
+    def build(self):
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for ch, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(ch, 0)
+                self.fail[next_state] = target if target != next_state else 0
+                self.out[next_state] = self.out[next_state] or self.out[self.fail[next_state]]
+    
+    def search(self, text):
+        goto = self.goto
+        fail = self.fail
+        out = self.out
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                return True
+        return False
+
+
+class IPRangeIndex:
+    def __init__(self, networks=()):
+        ranges = {4: [], 6: []}
+        for network in networks:
+            ranges[network.version].append((int(network.network_address), int(network.broadcast_address)))
+        
+        self.starts = {}
+        self.ends = {}
+        for version, intervals in ranges.items():
+            merged = []
+            for start, end in sorted(intervals):
+                if merged and start <= merged[-1][1] + 1:
+                    if end > merged[-1][1]:
+                        merged[-1][1] = end
+                else:
+                    merged.append([start, end])
+            self.starts[version] = [start for start, _ in merged]
+            self.ends[version] = [end for _, end in merged]
+    
+    @staticmethod
+    def parse_network(item):
+        if '/' not in item:
+            return None
+        try:
+            return ipaddress.ip_network(item.strip(), strict=False)
+        except ValueError:
+            return None
+    
+    def __len__(self):
+        return len(self.starts[4]) + len(self.starts[6])
+    
+    def contains(self, ip):
+        if not ip:
+            return False
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return False
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        value = int(address)
+        starts = self.starts[address.version]
+        index = bisect.bisect_right(starts, value) - 1
+        return index >= 0 and value <= self.ends[address.version][index]
+
+
+class TargetMatcher:
+    LINEAR_SCAN_LIMIT = 16
+    
+    def __init__(self, items):
+        self.items = []
+        networks = []
+        for item in dict.fromkeys(items):
+            if not item:
+                continue
+            network = IPRangeIndex.parse_network(item)
+            if network is not None:
+                networks.append(network)
+            else:
+                self.items.append(item)
+        self.ip_ranges = IPRangeIndex(networks)
+        self.linear = len(self.items) <= self.LINEAR_SCAN_LIMIT
+        if not self.linear:
+            self.domains = DomainSuffixTrie(item for item in self.items if '.' in item and not item.startswith('.'))
+            self.automaton = AhoCorasick(self.items)
+    
+    def matches(self, host, dest_ip):
+        if self.ip_ranges and self.ip_ranges.contains(dest_ip):
+            return True
+        if self.linear:
+            for item in self.items:
+                if item in host or item in dest_ip:
+                    return True
+            return False
+        if host and self.domains.match(host):
+            return True
+        return self.automaton.search(host) or self.automaton.search(dest_ip)
+
+
+class KeywordMatcher:
+    def __init__(self, keywords):
+        self.keywords = tuple(dict.fromkeys(keyword for keyword in keywords if keyword))
+        if self.keywords:
+            self.pattern = re.compile("|".join(re.escape(keyword) for keyword in self.keywords))
+        else:
+            self.pattern = None
+    
+    def matches(self, text):
+        return self.pattern is not None and self.pattern.search(text) is not None
+    
+    def filter(self, items):
+        if self.pattern is None:
+            return list(items)
+        search = self.pattern.search
+        return [item for item in items if not search(item)]
+
+
+class ProxyTopologyCache:
+    def __init__(self, client, blacklist=None, refresh_interval=60):
+        self.log_signal = Signal()
+        self.client = client
+        self.matcher = KeywordMatcher(blacklist or [])
+        self.refresh_interval = refresh_interval
+        self.lock = threading.Lock()
+        self.groups = []
+        self.filtered = {}
+        self.filter_memo = {}
+        self.version = 0
+        self.stale = True
+        self.running = False
+        self.refresh_event = threading.Event()
+        self.thread = None
+    
+    def is_switchable(self, group):
+        return group['type'] == 'Selector' or group['name'] == 'GLOBAL'
+    
+    def build_filtered(self, groups, previous_memo):
+        memo = {}
+        filtered = {}
+        for group in groups:
+            if not self.is_switchable(group):
+                continue
+            key = tuple(group.get('all', []))
+            if key not in memo:
+                memo[key] = previous_memo[key] if key in previous_memo else self.matcher.filter(key)
+            filtered[group['name']] = memo[key]
+        return filtered, memo
+    
+    def refresh(self):
+        try:
+            proxy_names, available_groups = get_proxies_and_groups(self.client.base_url, self.client.secret, self.client)
+        except Exception as e:
+            self.log_signal.emit(f"获取代理信息时出错: {e}", "error")
+            return False
+        return self.apply_groups(available_groups)
+    
+    def apply_groups(self, available_groups):
+        if not available_groups:
+            return False
+        
+        with self.lock:
+            previous_memo = self.filter_memo
+        filtered, memo = self.build_filtered(available_groups, previous_memo)
+        
+        with self.lock:
+            self.groups = available_groups
+            self.filtered = filtered
+            self.filter_memo = memo
+            self.version += 1
+            self.stale = False
+        return True
+    
+    def set_blacklist(self, blacklist):
+        matcher = KeywordMatcher(blacklist)
+        with self.lock:
+            if matcher.keywords == self.matcher.keywords:
+                return
+            self.matcher = matcher
+            groups = self.groups
+        filtered, memo = self.build_filtered(groups, {})
+        with self.lock:
+            self.filtered = filtered
+            self.filter_memo = memo
+            self.version += 1
+    
+    def get_groups(self):
+        if self.stale or not self.groups:
+            self.refresh()
+        return self.snapshot()
+    
+    def snapshot(self):
+        with self.lock:
+            return [dict(group) for group in self.groups]
+    
+    def switchable_groups(self):
+        return [group for group in self.get_groups() if self.is_switchable(group)]
+    
+    def filtered_proxies(self, group_name):
+        with self.lock:
+            return self.filtered.get(group_name, [])
+    
+    def set_now(self, group_name, proxy_name):
+        with self.lock:
+            for group in self.groups:
+                if group['name'] == group_name:
+                    group['now'] = proxy_name
+                    break
+    
+    def invalidate(self):
+        self.stale = True
+        self.refresh_event.set()
+    
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.refresh_loop, daemon=True)
+        self.thread.start()
+    
+    def refresh_loop(self):
+        while self.running:
+            self.refresh_event.wait(self.refresh_interval)
+            self.refresh_event.clear()
+            if not self.running:
+                break
+            try:
+                self.refresh()
+            except Exception as e:
+                self.log_signal.emit(f"后台刷新代理拓扑时出错: {e}", "error")
+    
+    def stop(self):
+        self.running = False
+        self.refresh_event.set()
+
+
+class DelayProber:
+    def __init__(self, client, test_url="http://www.gstatic.com/generate_204", timeout_ms=3000,
+                 max_workers=8, ttl=120, probe_interval=30):
+        self.log_signal = Signal()
+        self.client = client
+        self.test_url = test_url
+        self.timeout_ms = timeout_ms
+        self.max_workers = max_workers
+        self.ttl = ttl
+        self.probe_interval = probe_interval
+        self.lock = threading.Lock()
+        self.cache = {}
+        self.candidates = []
+        self.running = False
+        self.wake_event = threading.Event()
+        self.executor = None
+        self.thread = None
+    
+    def probe(self, name):
+        if not self.running:
+            return None
+        delay = None
+        try:
+            response = self.client.get(
+                f"/proxies/{requests.utils.quote(name, safe='')}/delay",
+                params={"timeout": self.timeout_ms, "url": self.test_url},
+                timeout=self.timeout_ms / 1000 + 2
+            )
+            if response.status_code == 200:
+                delay = response.json().get('delay') or None
+        except Exception:
+            delay = None
+        return self.record(name, delay)
+    
+    def record(self, name, delay):
+        with self.lock:
+            self.cache[name] = (delay, time.time())
+        return delay
+    
+    def is_fresh(self, name, now):
+        entry = self.cache.get(name)
+        return entry is not None and now - entry[1] < self.ttl
+    
+    def stale_candidates(self):
+        now = time.time()
+        with self.lock:
+            return [name for name in self.candidates if not self.is_fresh(name, now)]
+    
+    def probe_stale(self):
+        stale = self.stale_candidates()
+        if stale and self.executor is not None:
+            list(self.executor.map(self.probe, stale))
+        return len(stale)
+    
+    def set_candidates(self, names):
+        with self.lock:
+            changed = set(names) != set(self.candidates)
+            self.candidates = list(dict.fromkeys(names))
+        if changed:
+            self.wake_event.set()
+    
+    def fast_candidates(self, names, cutoff_ms):
+        now = time.time()
+        with self.lock:
+            result = []
+            for name in names:
+                entry = self.cache.get(name)
+                if entry is None or now - entry[1] >= self.ttl:
+                    continue
+                if entry[0] is not None and entry[0] <= cutoff_ms:
+                    result.append(name)
+            return result
+    
+    def probe_loop(self):
+        while self.running:
+            try:
+                self.probe_stale()
+            except Exception as e:
+                self.log_signal.emit(f"节点延迟探测时出错: {e}", "error")
+            self.wake_event.wait(self.probe_interval)
+            self.wake_event.clear()
+    
+    def start(self):
+        self.running = True
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        self.thread = threading.Thread(target=self.probe_loop, daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        self.running = False
+        self.wake_event.set()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ProxyRotator:
+    def __init__(self, members=(), rng=None):
+        self.rng = rng or random.Random()
+        self.members = {}
+        self.remaining = []
+        self.positions = {}
+        self.update_members(members)
+    
+    def __len__(self):
+        return len(self.remaining)
+    
+    def total(self):
+        return len(self.members)
+    
+    def add_remaining(self, name):
+        if name not in self.positions:
+            self.positions[name] = len(self.remaining)
+            self.remaining.append(name)
+    
+    def discard(self, name):
+        index = self.positions.pop(name, None)
+        if index is None:
+            return False
+        last = self.remaining.pop()
+        if index < len(self.remaining):
+            self.remaining[index] = last
+            self.positions[last] = index
+        return True
+    
+    def next(self):
+        if not self.remaining:
+            return None
+        name = self.remaining[self.rng.randrange(len(self.remaining))]
+        self.discard(name)
+        return name
+    
+    def reset(self):
+        self.remaining = list(self.members)
+        self.positions = {name: index for index, name in enumerate(self.remaining)}
+    
+    def update_members(self, members):
+        members = dict.fromkeys(members)
+        for name in self.members:
+            if name not in members:
+                self.discard(name)
+        for name in members:
+            if name not in self.members:
+                self.add_remaining(name)
+        self.members = members
+
+
+class ClashWebSocket:
+    GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+    def __init__(self, url, headers=None, timeout=5):
+        self.url = url
+        self.headers = headers or {}
+        self.timeout = timeout
+        self.sock = None
+        self.buffer = bytearray()
+        self.fragments = []
+
+    def connect(self):
+        secure, host, port, path = self.endpoint()
+
+        sock = socket.create_connection((host, port), timeout=self.timeout)
+        if secure:
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=host)
+
+        key = base64.b64encode(os.urandom(16)).decode()
+        sock.sendall(self.handshake_request(host, port, path, key))
+
+        response = bytearray()
+        while b"\r\n\r\n" not in response:
+            chunk = sock.recv(4096)
+            if not chunk:
+                sock.close()
+                raise ConnectionError("WebSocket握手时连接被关闭")
+            response.extend(chunk)
+        head, _, rest = bytes(response).partition(b"\r\n\r\n")
+        try:
+            self.verify_handshake(head, key)
+        except ConnectionError:
+            sock.close()
+            raise
+
+        self.sock = sock
+        self.buffer = bytearray(rest)
+        self.fragments = []
+
+    def endpoint(self):
+        parsed = urllib.parse.urlparse(self.url)
+        secure = parsed.scheme in ('wss', 'https')
+        host = parsed.hostname or '127.0.0.1'
+        port = parsed.port or (443 if secure else 80)
+        path = parsed.path or '/'
+        if parsed.query:
+            path += f"?{parsed.query}"
+        return secure, host, port, path
+
+    def handshake_request(self, host, port, path, key):
+        lines = [
+            f"GET {path} HTTP/1.1",
+            f"Host: {host}:{port}",
+            "Upgrade: websocket",
+            "Connection: Upgrade",
+            f"Sec-WebSocket-Key: {key}",
+            "Sec-WebSocket-Version: 13",
+        ]
+        for name, value in self.headers.items():
+            lines.append(f"{name}: {value}")
+        return ("\r\n".join(lines) + "\r\n\r\n").encode()
+
+    def verify_handshake(self, head, key):
+        status_line, *header_lines = head.decode('latin-1').split("\r\n")
+        status_parts = status_line.split(" ")
+        if len(status_parts) < 2 or status_parts[1] != "101":
+            raise ConnectionError(f"WebSocket握手失败: {status_line}")
+
+        response_headers = {}
+        for line in header_lines:
+            name, _, value = line.partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+        expected = base64.b64encode(hashlib.sha1((key + self.GUID).encode()).digest()).decode()
+        if response_headers.get('sec-websocket-accept') != expected:
+            raise ConnectionError("WebSocket握手校验失败")
+
+    def settimeout(self, timeout):
+        if self.sock:
+            self.sock.settimeout(timeout)
+
+    def send_frame(self, opcode, payload=b""):
+        self.sock.sendall(self.build_frame(opcode, payload))
+
+    @staticmethod
+    def build_frame(opcode, payload=b""):
+        header = bytearray([0x80 | opcode])
+        length = len(payload)
+        if length < 126:
+            header.append(0x80 | length)
+        elif length < 65536:
+            header.append(0x80 | 126)
+            header.extend(struct.pack("!H", length))
+        else:
+            header.append(0x80 | 127)
+            header.extend(struct.pack("!Q", length))
+        mask = os.urandom(4)
+        header.extend(mask)
+        masked = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        return bytes(header) + masked
+
+    def parse_frame(self):
+        buf = self.buffer
+        if len(buf) < 2:
+            return None
+        fin = buf[0] & 0x80
+        opcode = buf[0] & 0x0F
+        masked = buf[1] & 0x80
+        length = buf[1] & 0x7F
+        offset = 2
+        if length == 126:
+            if len(buf) < 4:
+                return None
+            length = struct.unpack("!H", buf[2:4])[0]
+            offset = 4
+        elif length == 127:
+            if len(buf) < 10:
+                return None
+            length = struct.unpack("!Q", buf[2:10])[0]
+            offset = 10
+        mask = None
+        if masked:
+            if len(buf) < offset + 4:
+                return None
+            mask = buf[offset:offset + 4]
+            offset += 4
+        if len(buf) < offset + length:
+            return None
+        payload = bytes(buf[offset:offset + length])
+        if mask:
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        del buf[:offset + length]
+        return fin, opcode, payload
+
+    def recv_message(self):
+        while True:
+            frame = self.parse_frame()
+            if frame is None:
+                chunk = self.sock.recv(65536)
+                if not chunk:
+                    raise ConnectionError("WebSocket连接已关闭")
+                self.buffer.extend(chunk)
+                continue
+
+            fin, opcode, payload = frame
+            if opcode == 0x8:
+                try:
+                    self.send_frame(0x8, payload[:2])
+                except Exception:
+                    pass
+                raise ConnectionError("WebSocket连接已被控制器关闭")
+            if opcode == 0x9:
+                self.send_frame(0xA, payload)
+                continue
+
+            message = self.handle_data_frame(fin, opcode, payload)
+            if message is not None:
+                return message
+
+    def handle_data_frame(self, fin, opcode, payload):
+        if opcode == 0xA:
+            return None
+        self.fragments.append(payload)
+        if not fin:
+            return None
+        message = b"".join(self.fragments)
+        self.fragments = []
+        return message
+
+    def close(self):
+        if self.sock:
+            try:
+                self.send_frame(0x8, struct.pack("!H", 1000))
+            except Exception:
+                pass
+            try:
+                self.sock.close()
+            except Exception:
+                pass
+            self.sock = None
+
+
+def parse_start_time(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        pass
+    match = re.match(r"(.*T\d{2}:\d{2}:\d{2})(?:\.(\d+))?(Z|[+-]\d{2}:\d{2})?$", value)
+    if not match:
+        return None
+    base, fraction, tz = match.groups()
+    text = base + (f".{fraction[:6].ljust(6, '0')}" if fraction else "") + ("+00:00" if tz in (None, 'Z') else tz)
+    try:
+        return datetime.fromisoformat(text).timestamp()
+    except ValueError:
+        return None
+
+
+class AdaptivePollInterval:
+    def __init__(self, min_interval, max_interval, initial=None, target_new_per_poll=2.0, smoothing=0.3, backoff=1.5):
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.target_new_per_poll = target_new_per_poll
+        self.smoothing = smoothing
+        self.backoff = backoff
+        self.rate = 0.0
+        self.interval = self.clamp(initial if initial is not None else min_interval)
+    
+    def clamp(self, value):
+        return min(self.max_interval, max(self.min_interval, value))
+    
+    def update(self, new_count, elapsed):
+        if elapsed > 0:
+            self.rate = self.smoothing * (new_count / elapsed) + (1 - self.smoothing) * self.rate
+        
+        desired = self.target_new_per_poll / self.rate if self.rate > 0 else self.max_interval
+        if desired < self.interval:
+            self.interval = self.clamp(desired)
+        else:
+            self.interval = self.clamp(min(desired, self.interval * self.backoff))
+        return self.interval
+
+
+class MissedConnectionEstimator:
+    MIN_SAMPLES = 10
+    
+    def __init__(self):
+        self.young_ids = set()
+        self.last_poll = None
+        self.at_risk = 0
+        self.died = 0
+        self.exposure = 0.0
+        self.missed = 0.0
+    
+    def hazard(self):
+        if self.at_risk < self.MIN_SAMPLES or self.exposure <= 0:
+            return 0.0
+        survived = max(self.at_risk - self.died, 0.5) / self.at_risk
+        return -math.log(survived) / (self.exposure / self.at_risk)
+    
+    def capture_ratio(self, gap):
+        rate = self.hazard() * gap
+        if rate <= 0:
+            return 1.0
+        return (1 - math.exp(-rate)) / rate
+    
+    def observe(self, new_conns, gone_ids, seen_time, interval):
+        missed_before = self.missed
+        gap = seen_time - self.last_poll if self.last_poll is not None else 0.0
+        
+        if gap > 0:
+            if self.young_ids:
+                self.at_risk += len(self.young_ids)
+                self.died += len(self.young_ids & gone_ids)
+                self.exposure += len(self.young_ids) * gap
+            if new_conns:
+                self.missed += len(new_conns) * (1 / self.capture_ratio(gap) - 1)
+        
+        self.young_ids = {conn['id'] for conn in new_conns} if self.last_poll is not None else set()
+        self.last_poll = seen_time
+        return self.missed - missed_before
+
+
+class ConnectionSnapshotParser:
+    ID_PATTERN = re.compile(rb'\{\s*"id"\s*:\s*"([^"\\]+)"')
+    ID_KEY = b'"id"'
+    NON_EMPTY_PATTERN = re.compile(rb'"connections"\s*:\s*\[\s*\{')
+    TRAILING = b" \t\r\n,"
+    
+    def __init__(self):
+        self.decoder = json.JSONDecoder()
+        self.fallback_count = 0
+    
+    def parse(self, raw, known_ids):
+        if isinstance(raw, str):
+            raw = raw.encode('utf-8')
+        try:
+            return self.parse_selective(raw, known_ids)
+        except ValueError:
+            self.fallback_count += 1
+            return self.parse_full(raw, known_ids)
+    
+    def parse_full(self, raw, known_ids):
+        all_current_conns = json_loads(raw).get('connections') or []
+        current_ids = {conn['id'] for conn in all_current_conns}
+        new_conns = [conn for conn in all_current_conns if conn['id'] not in known_ids]
+        return current_ids, new_conns
+    
+    def parse_selective(self, raw, known_ids):
+        current_ids = set()
+        new_conns = []
+        pending = None
+        matched = 0
+        for match in self.ID_PATTERN.finditer(raw):
+            matched += 1
+            if pending is not None:
+                new_conns.append(self.decode_object(raw, pending, match.start()))
+                pending = None
+            
+            conn_id = match.group(1).decode('utf-8')
+            current_ids.add(conn_id)
+            if conn_id not in known_ids:
+                pending = (match.start(), conn_id)
+        
+        if pending is not None:
+            new_conns.append(self.decode_object(raw, pending, None))
+        
+        if not current_ids and self.NON_EMPTY_PATTERN.search(raw):
+            raise ValueError("无法定位连接对象")
+        if raw.count(self.ID_KEY) != matched:
+            raise ValueError("存在 id 不在首位的连接对象")
+        return current_ids, new_conns
+    
+    def decode_object(self, raw, pending, end):
+        start, conn_id = pending
+        if end is not None:
+            conn = json_loads(raw[start:end].rstrip(self.TRAILING))
+        else:
+            conn = self.decoder.raw_decode(raw[start:].decode('utf-8'))[0]
+        if conn.get('id') != conn_id:
+            raise ValueError("连接对象结构与预期不符")
+        return conn
+
+class ConnectionRecorder:
+    METADATA_FIELDS = ('host', 'destinationIP', 'destinationPort')
+    
+    def __init__(self, path, controller=""):
+        self.path = path
+        self.started = time.time()
+        self.frames = 0
+        self.file = gzip.open(path, 'wt', encoding='utf-8')
+        self.write({'format': "clash-connections", 'version': 1, 'controller': controller, 'started': self.started})
+    
+    def write(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+        self.file.write("\n")
+    
+    def trim(self, conn):
+        metadata = conn.get('metadata') or {}
+        return {
+            'id': conn['id'],
+            'start': conn.get('start', ''),
+            'chains': conn.get('chains') or [],
+            'metadata': {field: metadata[field] for field in self.METADATA_FIELDS if field in metadata},
+        }
+    
+    def record(self, seen_time, interval, new_conns, gone_ids):
+        if self.file is None:
+            return
+        self.write({
+            't': round(seen_time - self.started, 3),
+            'i': interval,
+            'add': [self.trim(conn) for conn in new_conns],
+            'del': list(gone_ids),
+        })
+        self.frames += 1
+    
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def read_connection_recording_header(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        header = json.loads(f.readline())
+    if header.get('format') != "clash-connections":
+        raise ValueError(f"不是连接快照录制文件: {path}")
+    return header
+
+
+def read_connection_recording(path):
+    header = read_connection_recording_header(path)
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        f.readline()
+        current_ids = set()
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            new_conns = record['add']
+            current_ids = (current_ids - set(record['del'])) | {conn['id'] for conn in new_conns}
+            yield header['started'] + record['t'], record['i'], current_ids, new_conns
+
+
+class ConnectionMonitor:
+    STREAM_RETRY_MIN = 5
+    STREAM_RETRY_MAX = 300
+    
+    def __init__(self, controller_url, secret, interval=1, connection_filter_mode='blacklist', connection_list=None, use_stream=False, client=None,
+                 adaptive_bounds=None, name="default", metrics=None, recorder=None):
+        self.connections_detected = Signal()
+        self.poll_stats = Signal()
+        self.log_signal = Signal()
+        self.controller_url = normalize_controller_url(controller_url)
+        self.secret = secret
+        self.client = client or ControllerClient(self.controller_url, secret)
+        self.interval = interval
+        self.running = True
+        self.previous_connection_ids = set()
+        self.connection_filter_mode = connection_filter_mode
+        self.connection_list = connection_list or []
+        self.target_matcher = TargetMatcher(self.connection_list)
+        self.sample_size = 5
+        self.use_stream = use_stream
+        self.websocket = None
+        self.stream_retry_delay = self.STREAM_RETRY_MIN
+        self.stop_event = threading.Event()
+        self.poller = AdaptivePollInterval(adaptive_bounds[0], adaptive_bounds[1], interval) if adaptive_bounds else None
+        self.current_interval = interval
+        self.missed_estimator = MissedConnectionEstimator()
+        self.parser = ConnectionSnapshotParser()
+        self.recorder = recorder
+        
+        parsed_url = urllib.parse.urlparse(self.controller_url)
+        self.controller_host = parsed_url.hostname or "127.0.0.1"
+        self.controller_port = str(parsed_url.port or 9090)
+        
+        registry = metrics or default_registry
+        self.client.bind_metrics(registry, name)
+        self.frames_metric = registry.counter("clash_monitor_frames_total", "处理的 /connections 快照数").labels(controller=name)
+        self.connections_metric = registry.histogram(
+            "clash_monitor_connections_per_frame", "每个快照中的活跃连接数", MetricsRegistry.SIZE_BUCKETS
+        ).labels(controller=name)
+        self.new_connections_metric = registry.counter("clash_monitor_new_connections_total", "新出现的连接数").labels(controller=name)
+        filter_family = registry.counter("clash_monitor_filter_total", "新连接经过访问目标过滤后的结果")
+        self.counted_metric = filter_family.labels(controller=name, result="counted")
+        self.filtered_metric = filter_family.labels(controller=name, result="filtered")
+        self.controller_metric = filter_family.labels(controller=name, result="controller")
+        self.parse_metric = registry.histogram("clash_monitor_parse_duration_seconds", "解析单个快照的耗时").labels(controller=name)
+        self.interval_metric = registry.gauge("clash_monitor_poll_interval_seconds", "当前的监控间隔").labels(controller=name)
+        self.missed_metric = registry.gauge("clash_monitor_estimated_missed_connections", "估计的漏检连接累计数").labels(controller=name)
+    
+    def log_settings(self):
+        self.log_signal.emit(f"开始监控", "info")
+        if self.connection_list:
+            mode_text = "黑名单" if self.connection_filter_mode == 'blacklist' else "白名单"
+            self.log_signal.emit(f"已设置访问目标{mode_text}: {', '.join(self.connection_list)}", "info")
+    
+    def run(self):
+        self.log_settings()
+        
+        try:
+            while self.running:
+                if self.use_stream:
+                    self.run_stream()
+                if self.running:
+                    self.run_poll(self.poll_deadline())
+        except Exception as e:
+            self.log_signal.emit(f"连接监控异常: {e}", "error")
+        finally:
+            self.close_recorder()
+    
+    def poll_deadline(self):
+        if not self.use_stream:
+            return None
+        delay = self.stream_retry_delay
+        self.stream_retry_delay = min(delay * 2, self.STREAM_RETRY_MAX)
+        return time.time() + delay
+    
+    def run_poll(self, deadline=None):
+        last_poll_time = time.time()
+        while self.running and (deadline is None or time.time() < deadline):
+            poll_time = time.time()
+            try:
+                response = self.client.get("/connections")
+                if self.handle_poll_response(response.status_code, response.content, poll_time, last_poll_time):
+                    last_poll_time = poll_time
+                
+            except Exception as e:
+                self.log_signal.emit(f"监控连接时出错: {e}", "error")
+            
+            self.stop_event.wait(self.current_interval)
+    
+    def handle_poll_response(self, status_code, content, poll_time, last_poll_time):
+        if status_code != 200:
+            self.log_signal.emit(f"获取连接信息失败: HTTP {status_code}", "error")
+            return False
+        
+        new_count = self.process_payload(content, poll_time)
+        
+        if self.poller:
+            self.current_interval = self.poller.update(new_count, poll_time - last_poll_time)
+        return True
+    
+    def stream_url(self):
+        ws_url = self.controller_url.replace('https://', 'wss://', 1).replace('http://', 'ws://', 1)
+        return f"{ws_url}/connections?interval={max(int(self.interval * 1000), 100)}"
+    
+    def run_stream(self):
+        self.websocket = ClashWebSocket(self.stream_url(), self.client.headers)
+        try:
+            self.websocket.connect()
+        except Exception as e:
+            self.websocket = None
+            self.log_signal.emit(f"WebSocket推送不可用({e})，回退到轮询模式，{self.stream_retry_delay}秒后重试", "warning")
+            return
+        
+        self.log_signal.emit("已订阅控制器的WebSocket连接推送", "success")
+        self.websocket.settimeout(1)
+        
+        try:
+            while self.running:
+                try:
+                    message = self.websocket.recv_message()
+                except socket.timeout:
+                    continue
+                
+                try:
+                    self.process_payload(message, time.time())
+                    self.stream_retry_delay = self.STREAM_RETRY_MIN
+                except ValueError as e:
+                    self.log_signal.emit(f"解析WebSocket推送数据时出错: {e}", "error")
+        except Exception as e:
+            if self.running:
+                self.log_signal.emit(f"WebSocket推送中断({e})，回退到轮询模式，{self.stream_retry_delay}秒后重试", "warning")
+        finally:
+            if self.websocket:
+                self.websocket.close()
+                self.websocket = None
+    
+    def process_payload(self, raw, seen_time):
+        parse_start = time.perf_counter()
+        current_connection_ids, new_conns = self.parser.parse(raw, self.previous_connection_ids)
+        self.parse_metric.observe(time.perf_counter() - parse_start)
+        return self.process_snapshot(current_connection_ids, new_conns, seen_time)
+    
+    def process_connections(self, all_current_conns, seen_time):
+        current_connection_ids = {conn['id'] for conn in all_current_conns}
+        new_conns = [conn for conn in all_current_conns if conn['id'] not in self.previous_connection_ids]
+        return self.process_snapshot(current_connection_ids, new_conns, seen_time)
+    
+    def process_snapshot(self, current_connection_ids, new_conns, seen_time):
+        new_connection_ids = current_connection_ids - self.previous_connection_ids
+        gone_connection_ids = self.previous_connection_ids - current_connection_ids
+        if self.recorder:
+            self.recorder.record(seen_time, self.current_interval, new_conns, gone_connection_ids)
+        valid_new_conns_count = 0
+        controller_count = 0
+        
+        if new_conns:
+            samples = []
+            for conn in new_conns:
+                if self.is_controller_request(conn):
+                    controller_count += 1
+                    continue
+
+                is_in_list = self.is_target_in_list(conn)
+                should_count = False
+
+                if self.connection_filter_mode == 'blacklist':
+                    if not is_in_list:
+                        should_count = True
+                elif self.connection_filter_mode == 'whitelist':
+                    if self.connection_list and is_in_list:
+                        should_count = True
+                
+                if should_count:
+                    if len(samples) < self.sample_size:
+                        host = conn.get('metadata', {}).get('host', 'unknown')
+                        destination = conn.get('metadata', {}).get('destinationIP', 'unknown')
+                        samples.append(f"{host} -> {destination}")
+                    valid_new_conns_count += 1
+
+            if valid_new_conns_count > 0:
+                more = " 等" if valid_new_conns_count > len(samples) else ""
+                self.log_signal.emit(
+                    f"本轮检测到 {valid_new_conns_count} 个有效新连接: {', '.join(samples)}{more}",
+                    "connection"
+                )
+                self.connections_detected.emit(valid_new_conns_count, samples, time.perf_counter())
+
+        missed = self.missed_estimator.observe(new_conns, gone_connection_ids, seen_time, self.current_interval)
+        self.poll_stats.emit(self.current_interval, self.missed_estimator.missed)
+        
+        self.frames_metric.inc()
+        self.connections_metric.observe(len(current_connection_ids))
+        self.new_connections_metric.inc(len(new_conns))
+        self.counted_metric.inc(valid_new_conns_count)
+        self.filtered_metric.inc(len(new_conns) - valid_new_conns_count - controller_count)
+        self.controller_metric.inc(controller_count)
+        self.interval_metric.set(self.current_interval)
+        self.missed_metric.set(self.missed_estimator.missed)
+        
+        self.previous_connection_ids = current_connection_ids
+        return len(new_connection_ids) + missed
+    
+    def close_recorder(self):
+        if self.recorder:
+            self.recorder.close()
+            self.log_signal.emit(f"已录制 {self.recorder.frames} 个连接快照: {self.recorder.path}", "info")
+    
+    def is_controller_request(self, connection):
+        try:
+            metadata = connection.get('metadata', {})
+            dest_ip = metadata.get('destinationIP', '')
+            dest_port = metadata.get('destinationPort', '')
+            
+            is_to_controller = (
+                (dest_ip in ['127.0.0.1', 'localhost', self.controller_host]) and 
+                (str(dest_port) == str(self.controller_port))
+            )
+            
+            host = metadata.get('host', '')
+            if is_to_controller or host == self.controller_host:
+                return True
+                
+            return False
+        except Exception:
+            return False
+            
+    def is_target_in_list(self, connection):
+        try:
+            metadata = connection.get('metadata', {})
+            host = metadata.get('host', '')
+            dest_ip = metadata.get('destinationIP', '')
+            
+            return self.target_matcher.matches(host, dest_ip)
+        except Exception:
+            return False
+    
+    def stop(self):
+        self.running = False
+        self.stop_event.set()
+        websocket = self.websocket
+        if websocket and websocket.sock:
+            try:
+                websocket.sock.shutdown(socket.SHUT_RDWR)
+            except Exception:
+                pass
+
+
+SWITCH_TRACE_STAGES = ("detection", "trigger", "topology", "selection", "put_sent", "put_acked")
+
+
+class SwitchTrace:
+    def __init__(self, source, detected_at=None):
+        self.source = source
+        self.started = time.time()
+        self.stamps = {}
+        if detected_at is not None:
+            self.stamps['detection'] = detected_at
+        self.mark('trigger')
+    
+    def mark(self, stage):
+        self.stamps[stage] = time.perf_counter()
+    
+    def offsets_ms(self):
+        origin = min(self.stamps.values())
+        return {stage: (self.stamps[stage] - origin) * 1000 for stage in SWITCH_TRACE_STAGES if stage in self.stamps}
+    
+    def total_ms(self):
+        return (max(self.stamps.values()) - min(self.stamps.values())) * 1000
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class SwitchTraceRecorder:
+    def __init__(self, capacity=1000):
+        self.traces = deque(maxlen=capacity)
+        self.lock = threading.Lock()
+    
+    def add(self, trace):
+        with self.lock:
+            self.traces.append(trace)
+    
+    def snapshot(self):
+        with self.lock:
+            return list(self.traces)
+    
+    def summary(self, traces=None):
+        traces = self.snapshot() if traces is None else traces
+        spans = {}
+        for trace in traces:
+            stamps = [(stage, trace.stamps[stage]) for stage in SWITCH_TRACE_STAGES if stage in trace.stamps]
+            for (previous, start), (stage, end) in zip(stamps, stamps[1:]):
+                spans.setdefault(f"{previous}->{stage}", []).append((end - start) * 1000)
+            spans.setdefault("total", []).append(trace.total_ms())
+        
+        summary = {}
+        for span, values in spans.items():
+            values.sort()
+            summary[span] = {
+                'count': len(values),
+                'p50': percentile(values, 0.5),
+                'p90': percentile(values, 0.9),
+                'p99': percentile(values, 0.99),
+            }
+        return summary
+
+
+def export_switch_traces(path, recorders):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["controller", "started", "source"] + [f"{stage}_ms" for stage in SWITCH_TRACE_STAGES] + ["total_ms"])
+        count = 0
+        for name, recorder in recorders.items():
+            for trace in recorder.snapshot():
+                offsets = trace.offsets_ms()
+                writer.writerow(
+                    [name, datetime.fromtimestamp(trace.started).isoformat(timespec='milliseconds'), trace.source]
+                    + [f"{offsets[stage]:.3f}" if stage in offsets else "" for stage in SWITCH_TRACE_STAGES]
+                    + [f"{trace.total_ms():.3f}"]
+                )
+                count += 1
+    return count
+
+
+class SwitchRequest:
+    def __init__(self, groups=None):
+        self.groups = set(groups) if groups else None
+        self.done = threading.Event()
+        self.result = None
+        self.trace = SwitchTrace("api")
+    
+    def finish(self, result):
+        self.result = result
+        self.done.set()
+    
+    def wait(self, timeout=None):
+        return self.result if self.done.wait(timeout) else None
+
+
+class ProxySwitcher:
+    def __init__(self, interval, config_path, secret, controller_address, blacklist=None, switch_mode="time", switch_logic="random", client=None, topology_refresh_interval=60, switch_concurrency=8,
+                 latency_cutoff=800, probe_workers=8, rotation_seed=None, drain_connections=False, drain_batch_size=50, executor=None,
+                 name="default", metrics=None):
+        self.log_signal = Signal()
+        self.status_update = Signal()
+        self.used_proxy_update = Signal()
+        self.switch_completed = Signal()
+        self.interval = interval
+        self.config_path = config_path
+        self.secret = secret
+        self.controller_address = controller_address
+        self.client = client or ControllerClient(controller_address, secret)
+        self.blacklist = blacklist or ["最新", "流量", "套餐", "重置", "自动选择", "故障转移", "DIRECT", "REJECT"]
+        self.running = True
+        self.switch_event = threading.Event()
+        self.stop_event = threading.Event()
+        self.switch_mode = switch_mode
+        self.switch_logic = switch_logic
+        
+        self.used_proxies = set()
+        self.rng = random.Random(rotation_seed)
+        self.drain_connections = drain_connections
+        self.drain_batch_size = max(1, drain_batch_size)
+        self.drain_lock = threading.Lock()
+        self.drain_pending = set()
+        self.drain_thread = None
+        self.drain_executor = None
+        self.rotators = {}
+        self.rotator_versions = {}
+        self.topology = self.create_topology(topology_refresh_interval)
+        self.switch_concurrency = max(1, switch_concurrency)
+        self.shared_executor = executor
+        self.executor = None
+        self.latency_cutoff = latency_cutoff
+        self.prober = self.create_prober(probe_workers) if switch_logic == "latency" else None
+        self.topology.log_signal.connect(self.log_signal.emit)
+        if self.prober:
+            self.prober.log_signal.connect(self.log_signal.emit)
+        
+        self.paused = False
+        self.auto_triggered = False
+        self.pending_trace = None
+        self.traces = SwitchTraceRecorder()
+        self.request_lock = threading.Lock()
+        self.switch_requests = []
+        self.counters = {
+            'switches': 0,
+            'switched_groups': 0,
+            'failed_groups': 0,
+            'api_requests': 0,
+            'paused_triggers': 0,
+        }
+        
+        registry = metrics or default_registry
+        self.client.bind_metrics(registry, name)
+        self.switches_metric = registry.counter("clash_switcher_switches_total", "至少成功切换一个代理组的切换次数").labels(controller=name)
+        group_family = registry.counter("clash_switcher_group_switches_total", "代理组切换结果")
+        self.group_ok_metric = group_family.labels(controller=name, result="ok")
+        self.group_failed_metric = group_family.labels(controller=name, result="failed")
+        self.switch_latency_metric = registry.histogram("clash_switcher_switch_duration_seconds", "一次切换中所有PUT请求的总耗时").labels(controller=name)
+        trigger_family = registry.counter("clash_switcher_triggers_total", "切换触发次数")
+        self.auto_trigger_metric = trigger_family.labels(controller=name, source="auto")
+        self.api_trigger_metric = trigger_family.labels(controller=name, source="api")
+        self.paused_trigger_metric = trigger_family.labels(controller=name, source="paused")
+        self.trigger_latency_metric = registry.histogram(
+            "clash_switcher_trigger_to_ack_seconds", "从检测到新连接(或触发切换)到所有PUT请求完成的耗时"
+        ).labels(controller=name)
+    
+    def wake(self):
+        self.switch_event.set()
+    
+    def create_topology(self, refresh_interval):
+        return ProxyTopologyCache(self.client, self.blacklist, refresh_interval)
+    
+    def create_prober(self, max_workers):
+        return DelayProber(self.client, max_workers=max_workers)
+    
+    def switch_proxy_now(self, detected_at=None):
+        with self.request_lock:
+            if self.pending_trace is None:
+                self.pending_trace = SwitchTrace("connection" if detected_at is not None else "manual", detected_at)
+            self.auto_triggered = True
+        self.wake()
+    
+    def request_switch(self, groups=None):
+        request = SwitchRequest(groups)
+        with self.request_lock:
+            self.counters['api_requests'] += 1
+            self.api_trigger_metric.inc()
+            if not self.running:
+                request.finish({'error': "切换线程未运行"})
+                return request
+            self.switch_requests.append(request)
+        self.wake()
+        return request
+    
+    def set_paused(self, paused):
+        self.paused = paused
+        self.log_signal.emit("已暂停自动切换" if paused else "已恢复自动切换", "highlight")
+    
+    def current_selections(self):
+        return {group['name']: group.get('now', '') for group in self.topology.snapshot() if self.topology.is_switchable(group)}
+    
+    def stats(self):
+        with self.request_lock:
+            stats = dict(self.counters)
+        stats['paused'] = self.paused
+        stats['running'] = self.running
+        stats['switch_mode'] = self.switch_mode
+        stats['switch_logic'] = self.switch_logic
+        stats['controller'] = self.client.stats()
+        return stats
+    
+    def take_switch_requests(self, deadline_reached):
+        with self.request_lock:
+            switch_requests = self.switch_requests
+            self.switch_requests = []
+            automatic = self.auto_triggered or deadline_reached
+            trace = self.pending_trace
+            self.auto_triggered = False
+            self.pending_trace = None
+            if automatic and self.paused:
+                automatic = False
+                self.counters['paused_triggers'] += 1
+                self.paused_trigger_metric.inc()
+            elif automatic:
+                self.auto_trigger_metric.inc()
+        
+        if automatic or any(request.groups is None for request in switch_requests):
+            group_filter = None
+        else:
+            group_filter = set().union(*(request.groups for request in switch_requests))
+        
+        if not automatic:
+            trace = switch_requests[0].trace if switch_requests else None
+        elif trace is None:
+            trace = SwitchTrace("time")
+        return switch_requests, automatic, group_filter, trace
+    
+    def record_trace(self, trace):
+        trace.mark('put_acked')
+        self.traces.add(trace)
+        self.trigger_latency_metric.observe(trace.total_ms() / 1000)
+    
+    def finish_switch_requests(self, switch_requests, planned, results):
+        outcome = {}
+        for (group_name, old_selection, selected, total), (status_code, error) in zip(planned, results):
+            ok = error is None and status_code in [200, 204]
+            outcome[group_name] = {
+                'from': old_selection,
+                'to': selected,
+                'ok': ok,
+                'error': None if ok else str(error or f"HTTP {status_code}"),
+            }
+        for request in switch_requests:
+            if request.groups is None:
+                request.finish({'groups': outcome})
+            else:
+                request.finish({'groups': {
+                    name: outcome.get(name, {'ok': False, 'error': "未切换(组不存在、无可用节点或已是所选节点)"})
+                    for name in request.groups
+                }})
+    
+    def abort_switch_requests(self, reason):
+        with self.request_lock:
+            switch_requests = self.switch_requests
+            self.switch_requests = []
+        for request in switch_requests:
+            request.finish({'error': reason})
+    
+    def log_settings(self):
+        self.log_signal.emit(f"已设置黑名单节点: {', '.join(self.blacklist)}", "highlight")
+        self.log_signal.emit(f"切换模式: {('定时切换' if self.switch_mode == 'time' else '连接次数切换')}", "highlight")
+        self.log_signal.emit(f"切换逻辑: {SWITCH_LOGIC_NAMES.get(self.switch_logic, self.switch_logic)}", "highlight")
+        if self.prober:
+            self.log_signal.emit(f"延迟上限: {self.latency_cutoff}ms，后台并发探测节点延迟", "highlight")
+    
+    def run(self):
+        self.log_settings()
+        
+        self.topology.start()
+        self.executor = self.shared_executor or ThreadPoolExecutor(max_workers=self.switch_concurrency)
+        if self.drain_connections:
+            self.drain_executor = ThreadPoolExecutor(max_workers=self.switch_concurrency)
+        if self.prober:
+            self.prober.set_candidates(self.candidate_names())
+            self.prober.start()
+        
+        try:
+            next_switch_time = time.time() + self.interval
+            
+            if self.switch_mode == "connection":
+                self.log_signal.emit(f"等待连接次数达到阈值后进行切换...", "info")
+            
+            self.status_update.emit(True)
+            
+            while self.running:
+                if self.switch_mode == "time":
+                    self.switch_event.wait(max(0.0, next_switch_time - time.time()))
+                else:
+                    self.switch_event.wait()
+                self.switch_event.clear()
+                
+                if not self.running:
+                    break
+                
+                deadline_reached = self.switch_mode == "time" and time.time() >= next_switch_time
+                switch_requests, automatic, group_filter, trace = self.take_switch_requests(deadline_reached)
+                if not automatic and not switch_requests:
+                    if deadline_reached:
+                        next_switch_time = time.time() + self.interval
+                    continue
+                
+                available_groups = self.topology.switchable_groups()
+                trace.mark('topology')
+                
+                if not available_groups:
+                    self.log_signal.emit("未找到任何可用的代理组。请确保Clash for Windows正在运行。", "warning")
+                    self.topology.invalidate()
+                    self.finish_switch_requests(switch_requests, [], [])
+                    self.stop_event.wait(5)
+                    next_switch_time = time.time()
+                    continue
+                
+                if group_filter is not None:
+                    available_groups = [group for group in available_groups if group['name'] in group_filter]
+                
+                if self.prober:
+                    self.prober.set_candidates(self.candidate_names())
+                
+                planned = self.plan_selections(available_groups)
+                trace.mark('selection')
+                
+                switch_start = time.perf_counter()
+                trace.mark('put_sent')
+                results = self.bounded_map(self.put_selection, planned)
+                switch_elapsed = (time.perf_counter() - switch_start) * 1000
+                if planned:
+                    self.record_trace(trace)
+                
+                switched_groups = self.report_results(planned, results, switch_elapsed)
+                self.finish_switch_requests(switch_requests, planned, results)
+                
+                if switched_groups and self.drain_connections:
+                    self.schedule_drain(switched_groups)
+                
+                if automatic:
+                    next_switch_time = self.next_switch_time(switched_groups)
+                    
+        except Exception as e:
+            self.log_signal.emit(f"异常: {e}", "error")
+        finally:
+            self.running = False
+            self.abort_switch_requests("切换线程已停止")
+            self.topology.stop()
+            if self.executor is not self.shared_executor:
+                self.executor.shutdown(wait=False)
+            if self.drain_executor is not None:
+                self.drain_executor.shutdown(wait=False, cancel_futures=True)
+            if self.prober:
+                self.prober.stop()
+            self.log_signal.emit(self.client.stats_text(), "info")
+            self.status_update.emit(False)
+    
+    def plan_selections(self, available_groups):
+        planned = []
+        
+        for group in available_groups:
+            group_name = group['name']
+            filtered_proxies = self.topology.filtered_proxies(group_name)
+            
+            if filtered_proxies:
+                old_selection = group.get('now', '无')
+                selected = None
+                
+                if self.switch_logic == "random":
+                    selected = self.rng.choice(filtered_proxies)
+                elif self.switch_logic == "latency":
+                    fast_proxies = self.prober.fast_candidates(filtered_proxies, self.latency_cutoff)
+                    if fast_proxies:
+                        selected = self.rng.choice(fast_proxies)
+                    else:
+                        self.log_signal.emit(f"组 {group_name} 暂无延迟低于 {self.latency_cutoff}ms 的节点，本次随机选择", "warning")
+                        selected = self.rng.choice(filtered_proxies)
+                else:
+                    rotator = self.rotators.get(group_name)
+                    if rotator is None:
+                        rotator = ProxyRotator(filtered_proxies, self.rng)
+                        self.rotators[group_name] = rotator
+                        self.rotator_versions[group_name] = self.topology.version
+                        self.log_signal.emit(f"组 {group_name} 的代理池已重置，包含 {rotator.total()} 个代理", "info")
+                        self.used_proxy_update.emit(group_name, "", True)
+                    elif self.rotator_versions[group_name] != self.topology.version:
+                        rotator.update_members(filtered_proxies)
+                        self.rotator_versions[group_name] = self.topology.version
+                    
+                    rotator.discard(old_selection)
+                    
+                    if not rotator:
+                        rotator.reset()
+                        if len(rotator) > 1:
+                            rotator.discard(old_selection)
+                        self.log_signal.emit(f"组 {group_name} 的所有代理已轮换一遍，重新开始", "info")
+                        self.used_proxy_update.emit(group_name, "", True)
+                    
+                    selected = rotator.next()
+                
+                if selected == old_selection:
+                    continue
+                
+                planned.append((group_name, old_selection, selected, len(filtered_proxies)))
+            else:
+                self.log_signal.emit(f"警告: 组 {group_name} 没有可用的代理节点（排除黑名单后）", "warning")
+        
+        return planned
+    
+    def report_results(self, planned, results, switch_elapsed):
+        switched_groups = set()
+        failed_count = 0
+        
+        for (group_name, old_selection, selected, total), (status_code, error) in zip(planned, results):
+            if error is not None:
+                failed_count += 1
+                self.log_signal.emit(f"通过API修改代理选择失败: {error}", "error")
+            elif status_code in [200, 204]:
+                timestamp = f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}]"
+                
+                extra_info = ""
+                if self.switch_logic == "sequential":
+                    remaining = len(self.rotators[group_name])
+                    extra_info = f"(剩余可用代理: {remaining}/{total})"
+                    
+                    self.used_proxy_update.emit(group_name, selected, False)
+                    
+                self.log_signal.emit(
+                    f"{timestamp} 已将组 {group_name} 从 {old_selection} 切换到 {selected} {extra_info}",
+                    "success"
+                )
+                switched_groups.add(group_name)
+            else:
+                failed_count += 1
+                self.log_signal.emit(f"跳过组 {group_name} - API返回错误: {status_code}", "warning")
+        
+        with self.request_lock:
+            if switched_groups:
+                self.counters['switches'] += 1
+                self.switches_metric.inc()
+            self.counters['switched_groups'] += len(switched_groups)
+            self.counters['failed_groups'] += failed_count
+            self.group_ok_metric.inc(len(switched_groups))
+            self.group_failed_metric.inc(failed_count)
+            if planned:
+                self.switch_latency_metric.observe(switch_elapsed / 1000)
+        
+        if planned:
+            self.log_signal.emit(
+                f"本次切换完成: 成功 {len(planned) - failed_count} 组, 失败 {failed_count} 组, "
+                f"并发数 {self.switch_concurrency}, 总耗时 {switch_elapsed:.1f}ms",
+                "highlight"
+            )
+        self.switch_completed.emit(len(planned) - failed_count, failed_count, switch_elapsed)
+        return switched_groups
+    
+    def next_switch_time(self, switched_groups):
+        if not switched_groups:
+            self.log_signal.emit("警告: 未能切换任何代理组。请检查您的代理组配置。", "warning")
+            return time.time() + 1
+        
+        if self.switch_mode == "time":
+            self.log_signal.emit(f"等待 {self.interval} 秒后进行下一次切换...", "info")
+        return time.time() + self.interval
+    
+    def schedule_drain(self, switched_groups):
+        with self.drain_lock:
+            self.drain_pending |= switched_groups
+            if self.drain_thread is None:
+                self.drain_thread = threading.Thread(target=self.drain_loop, name="connection-drain", daemon=True)
+                self.drain_thread.start()
+    
+    def drain_loop(self):
+        while True:
+            with self.drain_lock:
+                switched_groups = self.drain_pending
+                self.drain_pending = set()
+                if not switched_groups or not self.running:
+                    self.drain_thread = None
+                    return
+            try:
+                self.drain_stale_connections(switched_groups)
+            except Exception as e:
+                if self.running:
+                    self.log_signal.emit(f"断开旧连接失败: {e}", "error")
+    
+    def drain_stale_connections(self, switched_groups):
+        drain_start = time.perf_counter()
+        try:
+            response = self.client.get("/connections")
+            if response.status_code != 200:
+                self.log_signal.emit(f"断开旧连接失败: 获取连接信息返回 HTTP {response.status_code}", "warning")
+                return
+            stale_ids = self.stale_connection_ids(response.content, switched_groups)
+        except Exception as e:
+            self.log_signal.emit(f"断开旧连接失败: {e}", "error")
+            return
+        
+        closed = 0
+        for offset in range(0, len(stale_ids), self.drain_batch_size):
+            if not self.running:
+                break
+            batch = stale_ids[offset:offset + self.drain_batch_size]
+            closed += sum(self.drain_executor.map(self.close_connection, batch))
+        
+        self.log_drain(closed, stale_ids, drain_start)
+    
+    def stale_connection_ids(self, raw, switched_groups):
+        connections = json_loads(raw).get('connections') or []
+        return [
+            conn['id'] for conn in connections
+            if not switched_groups.isdisjoint(conn.get('chains') or [])
+        ]
+    
+    def log_drain(self, closed, stale_ids, drain_start):
+        elapsed = (time.perf_counter() - drain_start) * 1000
+        if stale_ids:
+            self.log_signal.emit(
+                f"已断开 {closed}/{len(stale_ids)} 个经过已切换代理组的旧连接，耗时 {elapsed:.1f}ms",
+                "info"
+            )
+    
+    def bounded_map(self, func, items):
+        if self.executor is not self.shared_executor:
+            return list(self.executor.map(func, items))
+        
+        futures = []
+        pending = set()
+        for item in items:
+            if len(pending) >= self.switch_concurrency:
+                _, pending = wait(pending, return_when=FIRST_COMPLETED)
+            future = self.executor.submit(func, item)
+            futures.append(future)
+            pending.add(future)
+        return [future.result() for future in futures]
+    
+    def close_connection(self, conn_id):
+        try:
+            response = self.client.delete(f"/connections/{requests.utils.quote(conn_id, safe='')}")
+            return 1 if response.status_code in [200, 204] else 0
+        except Exception:
+            return 0
+    
+    def candidate_names(self):
+        names = []
+        for group in self.topology.switchable_groups():
+            names.extend(self.topology.filtered_proxies(group['name']))
+        return names
+    
+    def put_selection(self, plan):
+        group_name, old_selection, selected, total = plan
+        try:
+            encoded_group_name = requests.utils.quote(group_name)
+            response = self.client.put(f"/proxies/{encoded_group_name}", json={"name": selected})
+        except Exception as e:
+            self.topology.invalidate()
+            return None, e
+        return self.apply_put_result(group_name, selected, response.status_code)
+    
+    def apply_put_result(self, group_name, selected, status_code):
+        if status_code in [200, 204]:
+            self.topology.set_now(group_name, selected)
+        else:
+            self.topology.invalidate()
+        return status_code, None
+    
+    def stop(self):
+        with self.request_lock:
+            self.running = False
+        self.stop_event.set()
+        self.switch_event.set()
+        self.log_signal.emit("正在停止代理切换...", "highlight")
+
+class ConnectionThreshold:
+    def __init__(self, threshold):
+        self.threshold = max(1, threshold)
+        self.counter = 0
+    
+    def add(self, count):
+        self.counter += count
+        crossings = self.counter // self.threshold
+        self.counter %= self.threshold
+        return crossings
+
+
+def read_list_file(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+class ControllerProfile:
+    def __init__(self, name, controller, secret='', switch_mode='time', switch_logic='random', interval=60,
+                 threshold=5, api_poll_interval=1.0, use_stream=True, filter_mode='blacklist',
+                 connection_list=None, blacklist=None, drain_connections=False, latency_cutoff=800, record_path='',
+                 switch_concurrency=8):
+        self.name = name
+        self.controller = controller
+        self.secret = secret
+        self.switch_mode = switch_mode
+        self.switch_logic = switch_logic
+        self.interval = interval
+        self.threshold = threshold
+        self.api_poll_interval = api_poll_interval
+        self.use_stream = use_stream
+        self.filter_mode = filter_mode
+        self.connection_list = connection_list or []
+        self.blacklist = blacklist
+        self.drain_connections = drain_connections
+        self.latency_cutoff = latency_cutoff
+        self.record_path = record_path
+        self.switch_concurrency = switch_concurrency
+
+
+CONTROLLERS_TEMPLATE = """; 多控制器模式配置，每个小节对应一个 Clash 实例
+; config_path 与 controller/secret 二选一，列表文件路径相对于本文件所在目录
+;
+; [worker-1]
+; config_path = C:/Users/me/.config/clash/config.yaml
+; controller = 127.0.0.1:9090
+; secret =
+; switch_mode = connection        ; time 或 connection
+; switch_logic = sequential       ; random、sequential 或 latency
+; interval = 60
+; threshold = 5
+; api_poll_interval = 1.0
+; use_stream = true
+; filter_mode = blacklist         ; blacklist 或 whitelist
+; target_list = worker-1-targets.txt
+; keyword_list = keywordlist.txt
+; drain_connections = false
+; latency_cutoff = 800
+; switch_concurrency = 8          ; 该实例同时切换的代理组数
+; record_connections = worker-1-connections.jsonl.gz   ; 录制连接快照，供 benchmarks/replay_connections.py 回放
+"""
+
+
+def load_controller_profiles(path, default_blacklist=None):
+    parser = configparser.ConfigParser(inline_comment_prefixes=(';', '#'))
+    parser.read(path, encoding='utf-8')
+    base_dir = os.path.dirname(os.path.abspath(path))
+    
+    profiles = []
+    for name in parser.sections():
+        section = parser[name]
+        controller = section.get('controller', '').strip()
+        secret = section.get('secret', '').strip()
+        config_path = section.get('config_path', '').strip()
+        if config_path:
+            config_data = load_config(config_path)
+            controller = controller or config_data['controller']
+            secret = secret or config_data['secret']
+        if not controller:
+            raise ValueError(f"控制器 {name} 未配置 controller 或 config_path")
+        
+        connection_list = []
+        if section.get('target_list', '').strip():
+            connection_list = read_list_file(os.path.join(base_dir, section.get('target_list').strip()))
+        blacklist = default_blacklist
+        if section.get('keyword_list', '').strip():
+            blacklist = read_list_file(os.path.join(base_dir, section.get('keyword_list').strip()))
+        
+        record_path = section.get('record_connections', '').strip()
+        if record_path:
+            record_path = os.path.join(base_dir, record_path)
+        
+        switch_logic = section.get('switch_logic', 'random').strip()
+        if switch_logic not in SWITCH_LOGIC_NAMES:
+            raise ValueError(f"控制器 {name} 的切换逻辑无效: {switch_logic}")
+        switch_mode = section.get('switch_mode', 'time').strip()
+        if switch_mode not in SWITCH_MODE_NAMES:
+            raise ValueError(f"控制器 {name} 的切换模式无效: {switch_mode}")
+        filter_mode = section.get('filter_mode', 'blacklist').strip()
+        if filter_mode not in FILTER_MODE_NAMES:
+            raise ValueError(f"控制器 {name} 的访问目标过滤模式无效: {filter_mode}")
+        
+        profiles.append(ControllerProfile(
+            name, controller, secret,
+            switch_mode=switch_mode,
+            switch_logic=switch_logic,
+            interval=section.getint('interval', 60),
+            threshold=section.getint('threshold', 5),
+            api_poll_interval=section.getfloat('api_poll_interval', 1.0),
+            use_stream=section.getboolean('use_stream', True),
+            filter_mode=filter_mode,
+            connection_list=connection_list,
+            blacklist=blacklist,
+            drain_connections=section.getboolean('drain_connections', False),
+            latency_cutoff=section.getint('latency_cutoff', 800),
+            record_path=record_path,
+            switch_concurrency=section.getint('switch_concurrency', 8),
+        ))
+    return profiles
+
+
+class MultiControllerManager:
+    def __init__(self, profiles, pool_size=64, workers=16):
+        self.log_signal = Signal()
+        self.status_signal = Signal()
+        self.running_changed = Signal()
+        self.used_proxy_update = Signal()
+        self.switch_completed = Signal()
+        self.profiles = profiles
+        self.pool_size = pool_size
+        self.workers = workers
+        self.session = None
+        self.executor = None
+        self.instances = {}
+        self.threads = []
+        self.lock = threading.Lock()
+    
+    def start(self):
+        self.session = ControllerClient.create_session(self.pool_size, pool_connections=max(4, len(self.profiles)))
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        
+        for profile in self.profiles:
+            client = ControllerClient(profile.controller, profile.secret, session=self.session)
+            switcher = ProxySwitcher(
+                profile.interval, "", profile.secret, profile.controller, profile.blacklist,
+                profile.switch_mode, profile.switch_logic, client,
+                latency_cutoff=profile.latency_cutoff,
+                drain_connections=profile.drain_connections,
+                switch_concurrency=profile.switch_concurrency,
+                executor=self.executor,
+                name=profile.name,
+            )
+            monitor = None
+            if profile.switch_mode == "connection":
+                monitor = ConnectionMonitor(
+                    profile.controller, profile.secret, profile.api_poll_interval, profile.filter_mode,
+                    profile.connection_list, profile.use_stream, client, name=profile.name,
+                    recorder=ConnectionRecorder(profile.record_path, profile.controller) if profile.record_path else None,
+                )
+            self.add_instance(profile, client, switcher, monitor)
+        
+        self.launch()
+    
+    def add_instance(self, profile, client, switcher, monitor):
+        instance = {
+            'profile': profile,
+            'client': client,
+            'switcher': switcher,
+            'monitor': monitor,
+            'threshold': ConnectionThreshold(profile.threshold),
+            'running': False,
+            'switches': 0,
+            'failed_groups': 0,
+        }
+        self.instances[profile.name] = instance
+        
+        name = profile.name
+        switcher.log_signal.connect(lambda message, message_type, name=name: self.log_signal.emit(f"[{name}] {message}", message_type))
+        switcher.status_update.connect(lambda running, name=name: self.on_status_update(name, running))
+        switcher.switch_completed.connect(lambda ok, failed, elapsed, name=name: self.on_switch_completed(name, ok, failed))
+        switcher.used_proxy_update.connect(lambda group, proxy, clear, name=name: self.used_proxy_update.emit(f"{name}/{group}", proxy, clear))
+        
+        if monitor:
+            monitor.log_signal.connect(lambda message, message_type, name=name: self.log_signal.emit(f"[{name}] {message}", message_type))
+            monitor.connections_detected.connect(
+                lambda count, samples, detected_at, name=name: self.on_connections_detected(name, count, detected_at)
+            )
+        
+        self.log_signal.emit(
+            f"[{name}] 控制器 {client.base_url}，{SWITCH_MODE_NAMES[profile.switch_mode]}，{SWITCH_LOGIC_NAMES[profile.switch_logic]}", "success"
+        )
+    
+    def launch(self):
+        for name, instance in self.instances.items():
+            self.threads.append(threading.Thread(target=instance['switcher'].run, name=f"switcher-{name}", daemon=True))
+            if instance['monitor']:
+                self.threads.append(threading.Thread(target=instance['monitor'].run, name=f"monitor-{name}", daemon=True))
+        for thread in self.threads:
+            thread.start()
+        self.emit_status()
+    
+    def switchers(self):
+        return {name: instance['switcher'] for name, instance in self.instances.items()}
+    
+    def on_connections_detected(self, name, count, detected_at=None):
+        instance = self.instances.get(name)
+        if not instance:
+            return
+        crossings = instance['threshold'].add(count)
+        if crossings:
+            if instance['switcher'].paused:
+                self.log_signal.emit(f"[{name}] 达到连接阈值({instance['profile'].threshold}次)，自动切换已暂停，忽略本次触发", "info")
+            else:
+                self.log_signal.emit(f"[{name}] 达到连接阈值({instance['profile'].threshold}次)，触发IP切换", "highlight")
+            instance['switcher'].switch_proxy_now(detected_at)
+    
+    def on_status_update(self, name, running):
+        with self.lock:
+            if name in self.instances:
+                self.instances[name]['running'] = running
+            all_stopped = not any(instance['running'] for instance in self.instances.values())
+        self.emit_status()
+        if all_stopped:
+            self.running_changed.emit(False)
+    
+    def on_switch_completed(self, name, ok, failed):
+        with self.lock:
+            instance = self.instances.get(name)
+            if instance:
+                if ok:
+                    instance['switches'] += 1
+                instance['failed_groups'] += failed
+        self.emit_status()
+        self.switch_completed.emit(name, ok, failed)
+    
+    def status_text(self):
+        with self.lock:
+            running = sum(1 for instance in self.instances.values() if instance['running'])
+            switches = sum(instance['switches'] for instance in self.instances.values())
+            failed = sum(instance['failed_groups'] for instance in self.instances.values())
+        requests_count = sum(instance['client'].stats()['requests'] for instance in self.instances.values())
+        return (f"多控制器模式: {running}/{len(self.instances)} 个实例运行中 | 累计切换 {switches} 次 | "
+                f"失败 {failed} 组 | 控制器请求 {requests_count} 次")
+    
+    def emit_status(self):
+        self.status_signal.emit(self.status_text())
+    
+    def stop(self):
+        for instance in self.instances.values():
+            if instance['monitor']:
+                instance['monitor'].stop()
+            instance['switcher'].stop()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        if self.executor:
+            self.executor.shutdown(wait=False)
+        if self.session:
+            self.session.close()
+
+
+class ControlRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "ClashAutoSwitcher"
+    disable_nagle_algorithm = True
+    MAX_BODY = 65536
+    MAX_WAIT = 300.0
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def prepare(self):
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0 or length > self.MAX_BODY:
+            self.close_connection = True
+            self.send_json(400, {'error': "无效的 Content-Length"})
+            return None
+        if length:
+            self.rfile.read(length)
+        
+        control = self.server.control
+        if control.token and self.headers.get("Authorization") != f"Bearer {control.token}":
+            self.send_json(401, {'error': "未授权"})
+            return None
+        
+        parsed = urllib.parse.urlparse(self.path)
+        query = urllib.parse.parse_qs(parsed.query)
+        switchers = control.get_switchers()
+        name = query.get('controller', [None])[0]
+        if name is not None:
+            if name not in switchers:
+                self.send_json(404, {'error': f"控制器不存在: {name}"})
+                return None
+            switchers = {name: switchers[name]}
+        return parsed.path.rstrip('/'), query, switchers
+    
+    def do_GET(self):
+        prepared = self.prepare()
+        if prepared is None:
+            return
+        path, query, switchers = prepared
+        
+        if path == "/metrics":
+            body = self.server.control.registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif path == "/traces":
+            self.send_json(200, {
+                name: {
+                    'summary': switcher.traces.summary(),
+                    'recent': [
+                        {'started': trace.started, 'source': trace.source, 'offsets_ms': trace.offsets_ms()}
+                        for trace in switcher.traces.snapshot()[-20:]
+                    ],
+                }
+                for name, switcher in switchers.items()
+            })
+        elif path == "/selections":
+            self.send_json(200, {name: switcher.current_selections() for name, switcher in switchers.items()})
+        elif path == "/stats":
+            self.send_json(200, {name: switcher.stats() for name, switcher in switchers.items()})
+        else:
+            self.send_json(404, {'error': "未知路径"})
+    
+    def do_POST(self):
+        prepared = self.prepare()
+        if prepared is None:
+            return
+        path, query, switchers = prepared
+        
+        if path == "/switch":
+            try:
+                timeout = float(query.get('timeout', ['10'])[0])
+            except ValueError:
+                self.send_json(400, {'error': "无效的 timeout 参数"})
+                return
+            timeout = min(max(timeout, 0.0), self.MAX_WAIT) if math.isfinite(timeout) else self.MAX_WAIT
+            
+            groups = query.get('group') or None
+            switch_requests = {name: switcher.request_switch(groups) for name, switcher in switchers.items()}
+            if query.get('wait', ['0'])[0] not in ('1', 'true'):
+                self.send_json(202, {'accepted': list(switch_requests)})
+                return
+            
+            deadline = time.time() + timeout
+            results = {}
+            for name, request in switch_requests.items():
+                results[name] = request.wait(max(0.0, deadline - time.time()))
+            if any(result is None for result in results.values()):
+                self.send_json(504, {'error': "等待切换结果超时", 'results': results})
+            else:
+                self.send_json(200, {'results': results})
+        elif path in ("/pause", "/resume"):
+            for switcher in switchers.values():
+                switcher.set_paused(path == "/pause")
+            self.send_json(200, {name: {'paused': switcher.paused} for name, switcher in switchers.items()})
+        else:
+            self.send_json(404, {'error': "未知路径"})
+
+
+class ControlServer:
+    def __init__(self, switchers, host="127.0.0.1", port=9099, token="", registry=None):
+        self.switchers = switchers
+        self.registry = registry or default_registry
+        self.host = host
+        self.port = port
+        self.token = token
+        self.server = None
+        self.thread = None
+    
+    def get_switchers(self):
+        return self.switchers() if callable(self.switchers) else self.switchers
+    
+    @property
+    def address(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    def start(self):
+        self.server = ThreadingHTTPServer((self.host, self.port), ControlRequestHandler)
+        self.server.daemon_threads = True
+        self.server.control = self
+        self.thread = threading.Thread(target=self.server.serve_forever, name="control-server", daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None